@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'mailing',
     'users',
@@ -118,6 +119,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Права пользователей кешируются в Redis, сброс — при изменении групп и прав
+AUTHENTICATION_BACKENDS = ['users.backends.CachedPermissionsBackend']
+PERMISSIONS_CACHE_TIMEOUT = 60 * 60
+
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'mailing:index'
@@ -137,6 +142,53 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Пул SMTP-соединений для рассылок
+MAILING_POOL_SIZE = 4
+MAILING_MAX_MESSAGES_PER_CONNECTION = 100
+
+# Асинхронная отправка: писем одновременно и лимит на одно письмо, сек.
+MAILING_ASYNC_CONCURRENCY = 20
+MAILING_SEND_TIMEOUT = 30
+
+# Сколько попыток рассылки копится в памяти перед bulk_create
+MAILING_ATTEMPT_BATCH_SIZE = 500
+
+# Журнал попыток секционирован по месяцам: сколько будущих секций держать созданными
+MAILING_ATTEMPT_PARTITIONS_AHEAD = 2
+
+# Сколько дней хранить отдельные попытки; более старые секции сворачиваются в AttemptDailySummary и удаляются
+MAILING_ATTEMPT_RETENTION_DAYS = 180
+
+# Размер пачки при потоковом чтении получателей рассылки
+MAILING_RECIPIENT_CHUNK_SIZE = 2000
+
+# Адрес сайта для абсолютных ссылок в письмах (отписка)
+SITE_URL = os.getenv("SITE_URL", "http://127.0.0.1:8000")
+
+# Лимиты отправки по доменам получателей, писем в секунду (общие для всех обработчиков через Redis)
+MAILING_DOMAIN_RATE_LIMITS = {
+    'mail.ru': 10,
+    'gmail.com': 20,
+    'yandex.ru': 10,
+}
+
+# Лимит для остальных доменов; None — без ограничения
+MAILING_DEFAULT_DOMAIN_RATE = None
+
+# Сколько скомпилированных сообщений держит LRU-кеш mailing.rendering.template_cache
+MAILING_TEMPLATE_CACHE_SIZE = 128
+
+# MIME письма рассылки собирается один раз, на каждого получателя подставляются только его значения
+MAILING_PREPARED_MESSAGES = True
+
+# Размер пачки bulk_create при импорте получателей из файла
+MAILING_IMPORT_BATCH_SIZE = 1000
+
+# Очередь служебных писем (users.outbox): размер пачки, число попыток и первая пауза перед повтором, сек.
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 30
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
@@ -0,0 +1,87 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def version_key(model):
+    return f"view_cache:version:{model._meta.label_lower}"
+
+
+def bump_version(model):
+    """Увеличивает версию модели: закешированные по ней страницы больше не используются"""
+    key = version_key(model)
+    if not cache.add(key, 2, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+
+def _digest(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _cache_key(request, models):
+    user = request.user
+    permissions = sorted(user.get_all_permissions()) if user.is_active else []
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    return "view_cache:page:{}:{}".format(
+        user.pk,
+        _digest(
+            user.is_superuser,
+            permissions,
+            [versions.get(key, 1) for key in keys],
+            # Страница содержит CSRF-токен, он должен соответствовать текущему секрету пользователя
+            request.META["CSRF_COOKIE"],
+            request.get_full_path(),
+        ),
+    )
+
+
+def _messages_shown(request):
+    storage = getattr(request, "_messages", None)
+    return storage is not None and storage.used
+
+
+def cache_per_user(timeout, models):
+    """
+    Кеширует GET-ответ представления отдельно для каждого пользователя и набора его прав.
+    В ключ входят версии моделей из models: сохранение или удаление их записей
+    увеличивает версию (см. bump_version), и старые страницы перестают отдаваться.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            # Без CSRF-cookie страница получит новый токен, такой ответ кешировать нельзя
+            if (
+                request.method != "GET"
+                or not request.user.is_authenticated
+                or not request.META.get("CSRF_COOKIE")
+            ):
+                return view_func(request, *args, **kwargs)
+
+            key = _cache_key(request, models)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view_func(request, *args, **kwargs)
+
+            def store(response):
+                # Страницу с показанными flash-сообщениями не кешируем, иначе они повторятся
+                if response.status_code == 200 and not _messages_shown(request):
+                    cache.set(key, (response.content, response["Content-Type"]), timeout)
+
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -7,10 +7,12 @@ class OwnerOrPermissionMixin:
 
     def dispatch(self, request, *args, **kwargs):
         obj = self.get_object()
-        owner = getattr(obj, self.owner_field, None)
+        # Объект, загруженный для проверки доступа, переиспользуется представлением
+        self._permission_object = obj
+        owner_id = getattr(obj, f"{self.owner_field}_id", None)
 
         # Доступ владельцу
-        if owner == request.user:
+        if owner_id is not None and owner_id == request.user.pk:
             return super().dispatch(request, *args, **kwargs)
 
         # Доступ по permissions
@@ -19,3 +21,9 @@ class OwnerOrPermissionMixin:
                 return super().dispatch(request, *args, **kwargs)
 
         raise PermissionDenied("Нет доступа")
+
+    def get_object(self, queryset=None):
+        cached = getattr(self, "_permission_object", None)
+        if queryset is None and cached is not None:
+            return cached
+        return super().get_object(queryset)
@@ -0,0 +1,131 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Func, Value
+from django.http import Http404
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Ниже этого числа строк по оценке планировщика считается точный COUNT(*)
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset, threshold=EXACT_COUNT_THRESHOLD):
+    """
+    Число строк queryset по оценке планировщика PostgreSQL (EXPLAIN, без выполнения запроса).
+    Оценка держится на статистике ANALYZE, поэтому маленькие выборки считаются точно.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < threshold:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для changelist админки: COUNT(*) по огромной таблице заменяется оценкой планировщика"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class Row(Func):
+    """ROW(a, b): сравнение (a, b) < (x, y) идёт по составному индексу одним диапазоном"""
+
+    function = "ROW"
+
+    def __init__(self, *expressions, output_field):
+        super().__init__(*expressions, output_field=output_field)
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_key, previous_key):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = paginator.encode(next_key) if next_key else None
+        self.previous_cursor = paginator.encode(previous_key) if previous_key else None
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу вместо OFFSET: от новых строк к старым по полям fields
+    (последним должен идти уникальный id). Страница — WHERE (поля) < (ключ) ORDER BY поля DESC LIMIT n
+    по составному индексу, поэтому любая страница, даже очень далёкая, открывается за одно и то же время.
+    Курсоры after/before — ключи последней и первой строки страницы; общее число строк — оценка планировщика.
+    """
+
+    def __init__(self, queryset, fields, per_page):
+        self.queryset = queryset
+        self.fields = fields
+        self.per_page = per_page
+        self._fields = [queryset.model._meta.get_field(name) for name in fields]
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.queryset)
+
+    def encode(self, key):
+        return urlsafe_base64_encode(force_bytes(json.dumps(
+            [value.isoformat() if hasattr(value, "isoformat") else value for value in key]
+        )))
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(force_str(urlsafe_base64_decode(cursor)))
+            if len(values) != len(self._fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self._fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404("Неверный курсор страницы")
+
+    def _key(self, obj):
+        return [getattr(obj, field.attname) for field in self._fields]
+
+    def _after(self, key, lookup):
+        row = Row(*self.fields, output_field=self._fields[0])
+        bound = Row(*[Value(value, output_field=field) for field, value in zip(self._fields, key)],
+                    output_field=self._fields[0])
+        return self.queryset.alias(keyset=row).filter(**{f"keyset__{lookup}": bound})
+
+    def page(self, after=None, before=None):
+        descending = [f"-{name}" for name in self.fields]
+        if before:
+            # Предыдущая страница: строки новее ключа по возрастанию, затем разворот
+            rows = list(self._after(self.decode(before), "gt").order_by(*self.fields)[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self._after(self.decode(after), "lt") if after else self.queryset
+            rows = list(queryset.order_by(*descending)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after)
+
+        next_key = self._key(rows[-1]) if rows and has_next else None
+        previous_key = self._key(rows[0]) if rows and has_previous else None
+        return KeysetPage(rows, self, next_key, previous_key)
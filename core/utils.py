@@ -0,0 +1,13 @@
+def keyset_rows(queryset, fields, chunk_size=2000):
+    """
+    Потоково перебирает строки queryset пачками по первичному ключу (keyset-пагинация):
+    WHERE id > last ORDER BY id LIMIT n. Первым в fields должен идти 'id'.
+    """
+    rows = queryset.order_by('pk').values_list(*fields, named=True)
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].id
@@ -1,15 +1,27 @@
 from django.contrib import admin
 
-from .models import Mailing, MailingIsSuccess, MailingRecipients, Message
+from core.pagination import EstimatedCountPaginator
+
+from .models import (AttemptDailySummary, Mailing, MailingIsSuccess, MailingJob, MailingRecipients, Message,
+                     RecipientSegment)
 
 
 @admin.register(MailingRecipients)
 class MailingRecipientsAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ('email', 'full_name',)
     ordering = ('email',)
 
 
+@admin.register(RecipientSegment)
+class RecipientSegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'created_at',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('header',)
@@ -22,13 +34,39 @@ class MailingAdmin(admin.ModelAdmin):
     list_display = ('id', 'status', 'start', 'end', 'message')
     list_filter = ('status',)
     filter_horizontal = ('recipients',)
-    search_fields = ('status', 'message__header',)
+    raw_id_fields = ('segment',)
+    search_fields = ('message__header',)
     actions = ['run_mailing_now']
 
 
 @admin.register(MailingIsSuccess)
 class MailingIsSuccessAdmin(admin.ModelAdmin):
-    list_display = ('mailing', 'date_mailing', 'status',)
+    list_display = ('mailing', 'date_mailing', 'status', 'code',)
     list_filter = ('status',)
+    list_select_related = ('mailing',)
+    raw_id_fields = ('mailing', 'recipient',)
+    # icontains -> UPPER(answer) LIKE, по триграммному индексу attempt_answer_trgm_idx
     search_fields = ('answer',)
-    ordering = ('-date_mailing',)
+    ordering = ('-date_mailing', '-id',)
+    # число строк — оценка планировщика, без COUNT(*) по всему журналу
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(AttemptDailySummary)
+class AttemptDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('day', 'mailing', 'status', 'count',)
+    list_filter = ('status',)
+    list_select_related = ('mailing',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('mailing',)
+    ordering = ('-day',)
+
+
+@admin.register(MailingJob)
+class MailingJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mailing', 'status', 'worker', 'created_at', 'finished_at', 'sent', 'failed',)
+    list_filter = ('status',)
+    raw_id_fields = ('mailing',)
+    ordering = ('-created_at',)
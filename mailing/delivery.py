@@ -0,0 +1,219 @@
+import queue
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.mail import get_connection
+
+
+# smtplib не возвращает код ответа на успешный DATA, он всегда 250
+SMTP_OK = 250
+
+
+def smtp_code(exc):
+    """Код ответа SMTP-сервера из исключения отправки, если сервер его прислал"""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        for code, _ in exc.recipients.values():
+            return code
+    return None
+
+
+class PooledConnection:
+    """Открытое соединение почтового бэкенда и число отправленных через него писем"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Ограниченный пул авторизованных соединений почтового бэкенда.
+
+    Соединение открывается лениво, переиспользуется для многих писем через
+    send_messages, пересоздаётся после max_messages писем и при обрыве
+    сессии сервером.
+    """
+
+    def __init__(self, size=None, max_messages=None, **connection_kwargs):
+        self.size = size or getattr(settings, 'MAILING_POOL_SIZE', 4)
+        self.max_messages = max_messages or getattr(settings, 'MAILING_MAX_MESSAGES_PER_CONNECTION', 100)
+        self.connection_kwargs = connection_kwargs
+        # Таймаут сокета SMTP-бэкенда: переданный явно или EMAIL_TIMEOUT, None — без ограничения
+        self.timeout = connection_kwargs.get('timeout', getattr(settings, 'EMAIL_TIMEOUT', None))
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        for _ in range(self.size):
+            self._idle.put(None)
+
+    def _open(self):
+        backend = get_connection(**self.connection_kwargs)
+        backend.open()
+        return PooledConnection(backend)
+
+    @staticmethod
+    def _discard(conn):
+        if conn is None:
+            return
+        try:
+            conn.backend.close()
+        except (OSError, smtplib.SMTPException):
+            pass
+
+    def send(self, email_message):
+        """
+        Отправляет письмо через свободное соединение пула.
+        Если сервер закрыл сессию, соединение пересоздаётся и отправка повторяется один раз.
+        """
+        conn = self._idle.get()
+        try:
+            if conn is not None and conn.sent >= self.max_messages:
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+            try:
+                sent = conn.backend.send_messages([email_message])
+            except smtplib.SMTPServerDisconnected:
+                # conn обнуляется до открытия, чтобы при ошибке в пул не вернулось закрытое соединение
+                self._discard(conn)
+                conn = None
+                conn = self._open()
+                sent = conn.backend.send_messages([email_message])
+            conn.sent += 1
+            return sent
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # Сервер ответил кодом ошибки, сессия при этом остаётся рабочей
+            raise
+        except Exception:
+            self._discard(conn)
+            conn = None
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Закрывает все открытые соединения пула"""
+        conns = []
+        while not self._idle.empty():
+            conns.append(self._idle.get_nowait())
+        for conn in conns:
+            self._discard(conn)
+        for _ in conns:
+            self._idle.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RateLimiter:
+    """Общее для всех потоков ограничение: не больше rate писем в секунду"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Занимает место следующего письма и возвращает, сколько секунд ждать до его отправки"""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(self._next, now) + self.interval
+        return max(0.0, delay)
+
+    def wait(self):
+        """Блокирует поток до момента, когда можно отправить следующее письмо"""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+# Токен-бакет домена в Redis: hash {tokens, ts}, время берётся с сервера Redis,
+# чтобы у обработчиков на разных машинах были одни часы
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local delay = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    delay = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(delay)
+"""
+
+
+def email_domain(email):
+    return email.rpartition('@')[2].lower()
+
+
+class DomainRateLimiter:
+    """
+    Ограничение скорости отправки по доменам получателей (токен-бакет на домен).
+
+    Лимиты, писем в секунду, берутся из MAILING_DOMAIN_RATE_LIMITS, для прочих доменов —
+    MAILING_DEFAULT_DOMAIN_RATE (None — без ограничения). Бакет вмещает burst писем,
+    по умолчанию секундный запас. Если кеш — Redis, состояние бакетов общее для всех
+    процессов-обработчиков; с другим кешем (разработка) бакеты живут в памяти процесса.
+    """
+
+    def __init__(self, rates=None, default_rate=None, cache_alias='default'):
+        self.rates = rates if rates is not None else getattr(settings, 'MAILING_DOMAIN_RATE_LIMITS', {})
+        self.default_rate = default_rate or getattr(settings, 'MAILING_DEFAULT_DOMAIN_RATE', None)
+        self.cache = caches[cache_alias]
+        self._script = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.rates or self.default_rate)
+
+    def rate_for(self, domain):
+        return self.rates.get(domain, self.default_rate)
+
+    def acquire(self, domain):
+        """
+        Забирает токен домена. Возвращает 0, если письмо можно отправлять сразу,
+        иначе — сколько секунд ждать до следующего токена (токен при этом не расходуется).
+        """
+        rate = self.rate_for(domain)
+        if not rate:
+            return 0
+        burst = max(1.0, float(rate))
+        if isinstance(self.cache, RedisCache):
+            return self._acquire_redis(domain, rate, burst)
+        return self._acquire_local(domain, rate, burst)
+
+    def _acquire_redis(self, domain, rate, burst):
+        if self._script is None:
+            self._script = self.cache._cache.get_client(write=True).register_script(TOKEN_BUCKET_SCRIPT)
+        key = self.cache.make_key(f'mailing:rate:{domain}')
+        return float(self._script(keys=[key], args=[rate, burst]))
+
+    def _acquire_local(self, domain, rate, burst):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(domain, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._buckets[domain] = (tokens - 1, now)
+                return 0
+            self._buckets[domain] = (tokens, now)
+            return (1 - tokens) / rate
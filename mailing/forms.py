@@ -1,6 +1,10 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+from django.utils.html import format_html
 
-from .models import Mailing, MailingRecipients, Message
+from .models import Mailing, MailingRecipients, Message, RecipientSegment
+from .rendering import PLACEHOLDERS, unknown_placeholders
 
 
 class BaseStyledForm(forms.ModelForm):
@@ -32,18 +36,97 @@ class MessageForm(BaseStyledForm):
 
     class Meta:
         model = Message
-        fields = ['header', 'body']
+        fields = ['header', 'body', 'html_body']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["header"].widget.attrs.update({"placeholder": "Заголовок сообщения"})
         self.fields["body"].widget.attrs.update({"placeholder": "Текст сообщения"})
+        self.fields["html_body"].widget.attrs.update({"placeholder": "HTML-версия (необязательно)"})
+        self.fields["body"].help_text = "Подстановки: " + ", ".join(f"{{{{ {name} }}}}" for name in PLACEHOLDERS)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in ("header", "body", "html_body"):
+            unknown = unknown_placeholders(cleaned_data.get(name) or "")
+            if unknown:
+                self.add_error(name, "Неизвестные подстановки: " + ", ".join(unknown))
+        return cleaned_data
+
+
+class RecipientPickerWidget(forms.SelectMultiple):
+    """
+    Выбор получателей без выгрузки всего списка в HTML: в select попадают только
+    уже выбранные получатели, остальные подгружаются поиском (см. RecipientSearchView).
+    """
+
+    def __init__(self, attrs=None, search_url=reverse_lazy("mailing:recipient_search")):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.queryset = MailingRecipients.objects.none()
+
+    def get_context(self, name, value, attrs):
+        selected = [pk for pk in value or [] if str(pk).isdigit()]
+        self.choices = [
+            (recipient.pk, f"{recipient.full_name} <{recipient.email}>")
+            for recipient in self.queryset.filter(pk__in=selected).only("id", "email", "full_name")
+        ]
+        return super().get_context(name, value, attrs)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        select = super().render(name, value, attrs, renderer)
+        return format_html(
+            '<input type="search" class="form-control mb-2" placeholder="Поиск по email или Ф.И.О." '
+            'data-recipient-search="{}" data-target="{}" autocomplete="off">'
+            '<div class="list-group mb-2" data-recipient-results="{}"></div>{}',
+            self.search_url, name, name, select,
+        )
+
+
+class RecipientChoiceField(forms.ModelMultipleChoiceField):
+    """
+    Множественный выбор получателей по id. Отправленные id проверяются пачками
+    одним запросом pk__in на пачку; в cleaned_data попадает список id.
+    """
+
+    widget = RecipientPickerWidget
+    check_batch_size = 5000
+
+    def _set_queryset(self, queryset):
+        super()._set_queryset(queryset)
+        self.widget.queryset = self.queryset
+
+    queryset = property(forms.ModelMultipleChoiceField._get_queryset, _set_queryset)
+
+    def clean(self, value):
+        if not value:
+            if self.required:
+                raise ValidationError(self.error_messages["required"], code="required")
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError(self.error_messages["invalid_list"], code="invalid_list")
+        for pk in value:
+            if not str(pk).isdigit():
+                raise ValidationError(self.error_messages["invalid_pk_value"], code="invalid_pk_value",
+                                      params={"pk": pk})
+        ids = sorted({int(pk) for pk in value})
+
+        found = set()
+        for start in range(0, len(ids), self.check_batch_size):
+            batch = ids[start:start + self.check_batch_size]
+            found.update(self.queryset.filter(pk__in=batch).values_list("pk", flat=True))
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise ValidationError(self.error_messages["invalid_choice"], code="invalid_choice",
+                                  params={"value": missing[0]})
+        return ids
 
 
 class MailingForm(BaseStyledForm):
     class Meta:
         model = Mailing
-        fields = ['start', 'end', 'message', 'recipients']
+        fields = ['start', 'end', 'message', 'segment', 'recipients']
+        field_classes = {'recipients': RecipientChoiceField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -62,3 +145,50 @@ class MailingForm(BaseStyledForm):
         self.fields["end"].input_formats = ["%Y-%m-%dT%H:%M", "%d.%m.%y %H:%M"]
 
         self.fields["recipients"].widget.attrs.update({"size": 5})
+        self.fields["recipients"].help_text = "Начните вводить email или Ф.И.О., чтобы найти получателя"
+        self.fields["segment"].help_text = "Для больших рассылок: состав сегмента определяется в момент отправки"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("segment"):
+            # Получатели сегмента не копируются в таблицу связей рассылки
+            cleaned_data["recipients"] = []
+        elif not cleaned_data.get("recipients"):
+            raise forms.ValidationError("Выберите сегмент или получателей.")
+        return cleaned_data
+
+
+class SegmentForm(BaseStyledForm):
+    """Форма сегмента: правила хранятся в RecipientSegment.rules"""
+
+    email_domain = forms.CharField(required=False, label="Домен email", help_text="Например, example.com")
+    email_contains = forms.CharField(required=False, label="Email содержит")
+    full_name_contains = forms.CharField(required=False, label="Ф.И.О. содержит")
+    comment_contains = forms.CharField(required=False, label="Комментарий содержит")
+
+    class Meta:
+        model = RecipientSegment
+        fields = ['name']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for rule in RecipientSegment.RULES:
+            self.fields[rule].initial = self.instance.rules.get(rule, "")
+
+    def save(self, commit=True):
+        self.instance.rules = {
+            rule: self.cleaned_data[rule].strip()
+            for rule in RecipientSegment.RULES
+            if self.cleaned_data[rule].strip()
+        }
+        return super().save(commit)
+
+
+class RecipientImportForm(forms.Form):
+    """Форма загрузки файла с получателями"""
+
+    file = forms.FileField(
+        label="Файл CSV или XLSX",
+        help_text="Колонки: email, full_name, comment",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xlsx"}),
+    )
@@ -0,0 +1,208 @@
+import codecs
+import csv
+import os
+import zipfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models.functions import Upper
+
+from core.cache import bump_version
+
+from .models import MailingRecipients
+from .stats import StatsServices
+
+COLUMNS = ('email', 'full_name', 'comment')
+
+# Кодировки CSV по порядку проверки: UTF-8 и выгрузка Excel в русской локали
+CSV_ENCODINGS = ('utf-8', 'cp1251')
+
+
+def decode_lines(fileobj, encodings=CSV_ENCODINGS):
+    """
+    Построчно декодирует двоичный файл. Строка, не прочитанная в текущей кодировке,
+    переключает файл на следующую: ASCII-начало файла одинаково в обеих кодировках.
+    """
+    encodings = list(encodings)
+    for number, line in enumerate(fileobj):
+        if number == 0 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        while True:
+            try:
+                yield line.decode(encodings[0])
+                break
+            except UnicodeDecodeError:
+                if len(encodings) == 1:
+                    raise
+                encodings.pop(0)
+
+
+class RecipientImporter:
+    """
+    Потоковый импорт получателей из CSV или XLSX.
+    Файл читается построчно, email проверяется и приводится к нижнему регистру,
+    дубликаты внутри пачки и уже существующие адреса (без учёта регистра) пропускаются,
+    новые записи вставляются INSERT ... ON CONFLICT DO NOTHING RETURNING: адрес, добавленный
+    параллельно, считается дубликатом, а не добавленным.
+    Память ограничена размером пачки, а не размером файла. Каждая пачка сохраняется
+    в своей транзакции вместе со счётчиком получателей, поэтому большой файл не держит
+    блокировки до конца импорта; при ошибке в середине файла предыдущие пачки остаются.
+    """
+
+    def __init__(self, owner, batch_size=None, max_errors=1000):
+        self.owner = owner
+        self.batch_size = batch_size or getattr(settings, 'MAILING_IMPORT_BATCH_SIZE', 1000)
+        self.max_errors = max_errors
+        self.result = {'created': 0, 'duplicates': 0, 'failed': 0, 'errors': []}
+
+    def import_file(self, fileobj, filename):
+        """Импортирует файл; fileobj открыт в двоичном режиме. Нечитаемый файл — ValidationError"""
+        try:
+            return self._import(fileobj, filename)
+        except ValidationError as exc:
+            if not self.result['created']:
+                raise
+            raise ValidationError(
+                f"{' '.join(exc.messages)} Строки до ошибки импортированы, добавлено: {self.result['created']}"
+            )
+        finally:
+            if self.result['created']:
+                bump_version(MailingRecipients)
+
+    def _import(self, fileobj, filename):
+        batch = {}
+        for line, row in self.rows(fileobj, filename):
+            try:
+                recipient = self.clean_row(row)
+            except ValidationError as exc:
+                self.error(line, row, ' '.join(exc.messages))
+                continue
+
+            if recipient.email in batch:
+                self.result['duplicates'] += 1
+                continue
+            batch[recipient.email] = recipient
+            if len(batch) >= self.batch_size:
+                self.save(batch)
+                batch = {}
+
+        self.save(batch)
+        return self.result
+
+    def rows(self, fileobj, filename):
+        """Строки файла в виде словарей с ключами COLUMNS и номером строки"""
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.xlsx':
+            raw_rows = self.xlsx_rows(fileobj)
+        elif extension == '.csv':
+            raw_rows = self.csv_rows(fileobj)
+        else:
+            raise ValidationError("Поддерживаются файлы .csv и .xlsx")
+
+        columns = COLUMNS
+        for line, values in enumerate(raw_rows, start=1):
+            values = ['' if value is None else str(value).strip() for value in values]
+            if not any(values):
+                continue
+            # Первая строка с названиями колонок задаёт их порядок
+            if line == 1 and 'email' in (value.lower() for value in values):
+                columns = [value.lower() for value in values]
+                continue
+            yield line, dict(zip(columns, values))
+
+    @staticmethod
+    def csv_rows(fileobj):
+        reader = csv.reader(decode_lines(fileobj))
+        try:
+            yield from reader
+        except UnicodeDecodeError:
+            raise ValidationError(
+                f"Строка {reader.line_num + 1}: неизвестная кодировка, сохраните файл в UTF-8 или Windows-1251"
+            )
+        except csv.Error as exc:
+            raise ValidationError(f"Строка {reader.line_num}: файл CSV повреждён ({exc})")
+
+    @staticmethod
+    def xlsx_rows(fileobj):
+        try:
+            from openpyxl import load_workbook
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise ValidationError("Для импорта XLSX установите пакет openpyxl")
+        try:
+            workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, ValueError, OSError):
+            raise ValidationError("Файл XLSX повреждён или не является книгой Excel")
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def clean_row(self, row):
+        email = row.get('email', '').lower()
+        full_name = row.get('full_name', '')
+        if not email:
+            raise ValidationError("Не указан email")
+        validate_email(email)
+        if len(email) > MailingRecipients._meta.get_field('email').max_length:
+            raise ValidationError("Слишком длинный email")
+        if not full_name:
+            raise ValidationError("Не указано Ф.И.О.")
+        return MailingRecipients(
+            email=email,
+            full_name=full_name[:MailingRecipients._meta.get_field('full_name').max_length],
+            comment=row.get('comment', ''),
+            owner=self.owner,
+        )
+
+    @staticmethod
+    def existing(emails):
+        """Уже сохранённые адреса из emails в верхнем регистре"""
+        # Адреса, добавленные формой, могут быть в любом регистре: сравнение по UPPER(email)
+        # идёт по индексу recipient_email_prefix_idx
+        return set(
+            MailingRecipients.objects.annotate(email_upper=Upper('email'))
+            .filter(email_upper__in=[email.upper() for email in emails])
+            .values_list('email_upper', flat=True)
+        )
+
+    @staticmethod
+    def insert(recipients):
+        """Вставляет получателей, пропуская занятые адреса; возвращает число вставленных"""
+        table = MailingRecipients._meta.db_table
+        created = 0
+        with connection.cursor() as cursor:
+            # по 1000 строк: число параметров запроса PostgreSQL ограничено 65535
+            for start in range(0, len(recipients), 1000):
+                chunk = recipients[start:start + 1000]
+                cursor.execute(
+                    f'INSERT INTO "{table}" (email, full_name, comment, unsubscribed, owner_id) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))} '
+                    f'ON CONFLICT (email) DO NOTHING RETURNING id',
+                    [
+                        value
+                        for recipient in chunk
+                        for value in (recipient.email, recipient.full_name, recipient.comment,
+                                      recipient.unsubscribed, recipient.owner_id)
+                    ],
+                )
+                created += len(cursor.fetchall())
+        return created
+
+    def save(self, batch):
+        if not batch:
+            return
+        existing = self.existing(batch)
+        new = [recipient for email, recipient in batch.items() if email.upper() not in existing]
+        with transaction.atomic():
+            created = self.insert(new)
+            StatsServices.increment(unique_recipients=created)
+        self.result['created'] += created
+        self.result['duplicates'] += len(batch) - created
+
+    def error(self, line, row, message):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < self.max_errors:
+            self.result['errors'].append((line, row.get('email', ''), message))
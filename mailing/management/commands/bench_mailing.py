@@ -0,0 +1,326 @@
+import asyncio
+import socketserver
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.template import Context, Template
+from django.utils import timezone
+
+from mailing.delivery import SMTPConnectionPool
+from mailing.models import (AttemptStatus, Mailing, MailingCheckpoint, MailingIsSuccess,
+                            MailingStatus, Message)
+from mailing.rendering import (CompiledMessage, PreparedMessage, TemplateCache, build_email,
+                               unsubscribe_url)
+from mailing.services import AttemptBuffer, MailingServices
+from mailing.stats import StatsServices
+
+SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-диалог: принимает любые письма и отвечает 250"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        # Имитация стоимости установки соединения (TLS-рукопожатие, приветствие сервера)
+        time.sleep(self.server.connect_delay)
+        self.reply("220 stub ESMTP")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b"\r\n")
+            if in_data:
+                if line == b".":
+                    in_data = False
+                    # Имитация времени ответа сервера на письмо
+                    time.sleep(self.server.reply_delay)
+                    with self.server.lock:
+                        self.server.received += 1
+                    self.reply("250 OK")
+                continue
+
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250-stub")
+                self.reply("250 8BITMIME")
+            elif command == b"DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0, reply_delay=0.0):
+        super().__init__(("127.0.0.1", 0), StubSMTPHandler)
+        self.connect_delay = connect_delay
+        self.reply_delay = reply_delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+
+class Command(BaseCommand):
+    help = "Замер скорости отправки рассылок на локальном SMTP-сервере-заглушке"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario", default="pool",
+            choices=["pool", "attempts", "async", "memory", "render", "build", "explain"],
+        )
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument(
+            "--mailing", type=int, default=None,
+            help="Рассылка для сценариев с БД (по умолчанию первая)",
+        )
+        parser.add_argument(
+            "--connect-delay", type=float, default=0.02,
+            help="Задержка заглушки на новое соединение, сек. (имитирует TLS-рукопожатие)",
+        )
+        parser.add_argument(
+            "--reply-delay", type=float, default=0.005,
+            help="Задержка заглушки перед ответом на письмо, сек. (имитирует сетевую задержку)",
+        )
+        parser.add_argument("--concurrency", type=int, default=20)
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['scenario']}")(options)
+
+    def get_mailing(self, options):
+        mailings = Mailing.objects.all()
+        if options["mailing"]:
+            mailings = mailings.filter(pk=options["mailing"])
+        mailing = mailings.first()
+        if mailing is None:
+            raise CommandError("Для замера нужна рассылка в БД")
+        return mailing
+
+    def start_stub_server(self, options):
+        """Запускает заглушку в фоновом потоке и возвращает параметры подключения к ней"""
+        server = StubSMTPServer(connect_delay=options["connect_delay"], reply_delay=options["reply_delay"])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        connection_kwargs = {
+            "backend": SMTP_BACKEND,
+            "host": host,
+            "port": port,
+            "username": "",
+            "password": "",
+            "use_ssl": False,
+            "use_tls": False,
+            "timeout": 30,
+        }
+        return server, connection_kwargs
+
+    def build_messages(self, count):
+        return [
+            EmailMessage(
+                subject="Benchmark",
+                body="Тело письма",
+                from_email="bench@example.com",
+                to=[f"user{i}@example.com"],
+            )
+            for i in range(count)
+        ]
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f"{label:<20} {count} писем за {elapsed:.2f} с — {count / elapsed:.0f} msg/s")
+
+    def bench_pool(self, options):
+        emails = self.build_messages(options["messages"])
+        server, connection_kwargs = self.start_stub_server(options)
+        try:
+            # Как send_mail: новое соединение на каждое письмо
+            started = time.perf_counter()
+            for email in emails:
+                get_connection(**connection_kwargs).send_messages([email])
+            self.report("без пула", len(emails), time.perf_counter() - started)
+
+            started = time.perf_counter()
+            with SMTPConnectionPool(size=1, **connection_kwargs) as pool:
+                for email in emails:
+                    pool.send(email)
+            self.report("с пулом", len(emails), time.perf_counter() - started)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def bench_attempts(self, options):
+        """Число запросов к БД на журнал попыток; все записи откатываются"""
+        mailing = self.get_mailing(options)
+        count = options["messages"]
+
+        def per_row():
+            for _ in range(count):
+                MailingIsSuccess.objects.create(status=AttemptStatus.SUCCESS, answer="OK", mailing=mailing)
+
+        def buffered():
+            with AttemptBuffer() as attempts:
+                for _ in range(count):
+                    attempts.add(status=AttemptStatus.SUCCESS, answer="OK", mailing=mailing)
+
+        for label, func in (("по одной записи", per_row), ("AttemptBuffer", buffered)):
+            queries = 0
+
+            def count_queries(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            started = time.perf_counter()
+            with connection.execute_wrapper(count_queries), transaction.atomic():
+                func()
+                transaction.set_rollback(True)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<20} {count} попыток: {queries} запросов к БД за {elapsed:.2f} с")
+
+    def bench_async(self, options):
+        """
+        Синхронная и асинхронная отправка рассылки на заглушку. Созданные попытки удаляются,
+        счётчики статистики и контрольная точка рассылки возвращаются к прежним значениям
+        """
+        mailing = self.get_mailing(options)
+        count = mailing.get_recipients().count()
+        concurrency = options["concurrency"]
+        last_id = MailingIsSuccess.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        checkpoint = MailingCheckpoint.objects.filter(mailing=mailing).values("started_at", "finished_at").first()
+        server, connection_kwargs = self.start_stub_server(options)
+        try:
+            started = time.perf_counter()
+            with SMTPConnectionPool(size=1, **connection_kwargs) as pool:
+                MailingServices.send_mailing(mailing, pool=pool)
+            self.report("синхронно", count, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            with SMTPConnectionPool(size=concurrency, **connection_kwargs) as pool:
+                asyncio.run(MailingServices.asend_mailing(mailing, pool=pool, concurrency=concurrency))
+            self.report(f"asyncio x{concurrency}", count, time.perf_counter() - started)
+        finally:
+            server.shutdown()
+            server.server_close()
+            with transaction.atomic():
+                created = MailingIsSuccess.objects.filter(mailing=mailing, id__gt=last_id)
+                StatsServices.forget_attempts(StatsServices.count_attempts(created), mailing.owner_id)
+                created.delete()
+                if checkpoint is None:
+                    MailingCheckpoint.objects.filter(mailing=mailing).delete()
+                else:
+                    MailingCheckpoint.objects.filter(mailing=mailing).update(**checkpoint)
+
+    def bench_memory(self, options):
+        """Пиковая память на перебор получателей рассылки: .all() против iter_recipients"""
+        mailing = self.get_mailing(options)
+
+        def materialized():
+            count = 0
+            for _ in mailing.get_recipients():
+                count += 1
+            return count
+
+        def streamed():
+            count = 0
+            for _ in MailingServices.iter_recipients(mailing.get_recipients()):
+                count += 1
+            return count
+
+        for label, func in (("recipients.all()", materialized), ("iter_recipients", streamed)):
+            tracemalloc.start()
+            started = time.perf_counter()
+            count = func()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f"{label:<20} {count} получателей: пик {peak / 1024 / 1024:.1f} МБ за {elapsed:.2f} с")
+
+    def sample_message(self):
+        return Message(
+            pk=0,
+            header="{{ full_name }}, новости недели",
+            body="Здравствуйте, {{ full_name }}!\n\n" + "Текст письма.\n" * 50
+            + "\n\nОтписаться: {{ unsubscribe_url }}",
+            html_body="<p>Здравствуйте, <b>{{ full_name }}</b>!</p>" + "<p>Текст письма.</p>\n" * 50
+            + '<a href="{{ unsubscribe_url }}">Отписаться</a>',
+        )
+
+    def sample_recipients(self, count):
+        Recipient = namedtuple("Recipient", ["id", "email", "full_name"])
+        return [Recipient(i, f"user{i}@example.com", f"Получатель <{i}>") for i in range(count)]
+
+    def bench_render(self, options):
+        """Персонализация писем: Template(...).render на каждого получателя против кеша скомпилированных сообщений"""
+        count = options["messages"]
+        message = self.sample_message()
+        recipients = self.sample_recipients(count)
+
+        def naive():
+            for r in recipients:
+                context = Context({
+                    "full_name": r.full_name, "email": r.email, "unsubscribe_url": unsubscribe_url(r.id),
+                })
+                Template(message.header).render(context)
+                Template(message.body).render(context)
+                Template(message.html_body).render(context)
+
+        def compiled():
+            cache = TemplateCache()
+            for r in recipients:
+                cache.get(message).render(r, unsubscribe_url(r.id))
+
+        for label, func in (("Template.render", naive), ("TemplateCache", compiled)):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<20} {count} писем за {elapsed:.2f} с — {count / elapsed:.0f} renders/s")
+
+    def bench_build(self, options):
+        """Сборка готовых байт письма на одном ядре: EmailMessage на каждого получателя против PreparedMessage"""
+        count = options["messages"]
+        compiled = CompiledMessage(self.sample_message())
+        recipients = self.sample_recipients(count)
+
+        def full():
+            for r in recipients:
+                build_email(compiled, r, "bench@example.com").message().as_bytes(linesep="\r\n")
+
+        def prepared():
+            message = PreparedMessage(compiled, "bench@example.com")
+            for r in recipients:
+                message.build(r).message().as_bytes(linesep="\r\n")
+
+        for label, func in (("EmailMessage", full), ("PreparedMessage", prepared)):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<20} {count} писем за {elapsed:.2f} с — {count / elapsed:.0f} msg/s")
+
+    def bench_explain(self, options):
+        """Планы горячих запросов по статусам: должны использовать индексы, а не полный просмотр таблицы"""
+        mailing = self.get_mailing(options)
+        now = timezone.now()
+        queries = {
+            "активные рассылки в окне (планировщик, send_mailing)": MailingServices.active_mailings(now),
+            "запущенные рассылки владельца (фильтр списка)": MailingServices.filter_by_status(
+                Mailing.objects.filter(owner_id=mailing.owner_id), MailingStatus.RUNNING, now
+            ),
+            "рассылки владельца по статусу": Mailing.objects.filter(
+                owner_id=mailing.owner_id, status=MailingStatus.DISABLED
+            ),
+            "неуспешные попытки рассылки": MailingIsSuccess.objects.filter(
+                mailing=mailing, status=AttemptStatus.FAILED
+            ),
+        }
+        for label, queryset in queries.items():
+            self.stdout.write(f"-- {label}")
+            self.stdout.write(queryset.explain())
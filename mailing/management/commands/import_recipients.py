@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from mailing.importers import RecipientImporter
+
+
+class Command(BaseCommand):
+    help = "Импортирует получателей из CSV/XLSX (колонки email, full_name, comment)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--owner", required=True, help="Email владельца получателей")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            owner = User.objects.get(email=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        importer = RecipientImporter(owner, batch_size=options["batch_size"])
+        try:
+            with open(options["path"], "rb") as fileobj:
+                result = importer.import_file(fileobj, options["path"])
+        except (OSError, ValidationError) as exc:
+            raise CommandError(str(exc))
+
+        for line, email, message in result["errors"]:
+            self.stderr.write(f"Строка {line} ({email}): {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено: {result['created']}, дубликатов: {result['duplicates']}, ошибок: {result['failed']}"
+        ))
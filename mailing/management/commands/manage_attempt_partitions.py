@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from mailing.partitions import AttemptPartitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт месячные секции журнала попыток наперёд, сворачивает секции старше срока хранения "
+        "в дневную сводку и удаляет их"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=None, help="Сколько будущих месяцев держать созданными")
+        parser.add_argument("--retention-days", type=int, default=None, help="Сколько дней хранить отдельные попытки")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, какие секции будут удалены")
+
+    def handle(self, *args, **options):
+        try:
+            if not options["dry_run"]:
+                for name in AttemptPartitions.ensure(ahead=options["ahead"]):
+                    self.stdout.write(f"Создана секция {name}")
+
+            for name, _, upper in AttemptPartitions.expired(retention_days=options["retention_days"]):
+                if options["dry_run"]:
+                    self.stdout.write(f"Будет удалена секция {name} (до {upper:%Y-%m-%d})")
+                    continue
+                total = AttemptPartitions.drop(name)
+                self.stdout.write(f"Секция {name} свёрнута в сводку и удалена, попыток: {total}")
+        except DatabaseError as exc:
+            raise CommandError(f"Не удалось обновить секции журнала попыток: {exc}")
+
+        self.stdout.write(self.style.SUCCESS("Секции журнала попыток обновлены"))
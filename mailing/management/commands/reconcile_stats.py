@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from mailing.stats import StatsServices
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики статистики главной страницы по исходным таблицам"
+
+    def handle(self, *args, **options):
+        values = StatsServices.reconcile()
+        for name, value in values.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
@@ -0,0 +1,150 @@
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from mailing.delivery import RateLimiter, SMTPConnectionPool
+from mailing.models import MailingJob
+from mailing.partitions import AttemptPartitions
+from mailing.services import MailingServices
+from users.outbox import OutboxSender
+
+
+class JobHeartbeat(threading.Thread):
+    """Фоновый поток, отмечающий, что обработчик задания жив"""
+
+    def __init__(self, job, interval):
+        super().__init__(daemon=True)
+        self.job_id = job.pk
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                MailingJob.objects.filter(pk=self.job_id).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = "Обработчик очереди рассылок: забирает задания из MailingJob и отправляет их"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Число потоков отправки на одно задание",
+        )
+        parser.add_argument(
+            "--max-rate", type=float, default=None,
+            help="Лимит отправки этого обработчика, писем в секунду",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=5.0,
+            help="Пауза между опросами пустой очереди, сек.",
+        )
+        parser.add_argument(
+            "--heartbeat", type=float, default=30.0,
+            help="Период отметки о работе задания, сек.; задания без отметки 3 периода возвращаются в очередь",
+        )
+        parser.add_argument(
+            "--schedule-interval", type=int, default=0,
+            help="Раз в столько секунд ставить в очередь рассылки с открытым окном start/end (0 — не ставить)",
+        )
+        parser.add_argument(
+            "--outbox-interval", type=float, default=1.0,
+            help="Период опроса очереди служебных писем в отдельном потоке, сек. (0 — не отправлять)",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Разобрать очередь и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        workers = max(1, options["workers"])
+        rate_limiter = RateLimiter(options["max_rate"]) if options["max_rate"] else None
+
+        # SIGTERM превращается в SystemExit: текущее задание вернётся в очередь
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+        self.stdout.write(f"Обработчик {self.worker} запущен")
+        # Служебные письма идут своим потоком и соединением, не дожидаясь текущей рассылки
+        outbox = None
+        if options["outbox_interval"] and not options["once"]:
+            outbox = OutboxSender(options["outbox_interval"], log=self.stdout.write)
+            outbox.start()
+        try:
+            with SMTPConnectionPool(size=workers) as pool:
+                while True:
+                    if options["schedule_interval"]:
+                        self.schedule(options["schedule_interval"])
+                    MailingServices.requeue_stale_jobs(options["heartbeat"] * 3)
+
+                    job = MailingServices.claim_job(self.worker)
+                    if job is None:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+
+                    self.run_job(job, pool, workers, rate_limiter, options["heartbeat"])
+        finally:
+            if outbox is not None:
+                outbox.stop()
+
+    def schedule(self, interval):
+        """Обновляет статусы и ставит в очередь активные рассылки; планирует только один обработчик за интервал"""
+        if not cache.add("mailing:worker:schedule", self.worker, interval):
+            return
+        now = timezone.now()
+        # секции журнала попыток на следующие месяцы, если cron с manage_attempt_partitions не настроен;
+        # неудача (например, строки диапазона уже в DEFAULT-секции) не должна останавливать обработчик
+        try:
+            AttemptPartitions.ensure(now)
+        except DatabaseError as exc:
+            self.stderr.write(f"Не удалось создать секции журнала попыток: {exc}")
+        MailingServices.transition_statuses(now)
+        # статусы только что переведены, окно ищется по частичному индексу mailing_active_window_idx
+        for mailing in MailingServices.active_mailings(now):
+            MailingServices.enqueue_mailing(mailing)
+
+    def run_job(self, job, pool, workers, rate_limiter, heartbeat_interval):
+        mailing = job.mailing
+        MailingServices.update_mailing_status(mailing)
+        can_send, error_message = MailingServices.can_send_now(mailing)
+        if not can_send:
+            MailingServices.finish_job(job, error=error_message)
+            self.stdout.write(f"Задание {job.id}: {error_message}")
+            return
+
+        heartbeat = JobHeartbeat(job, heartbeat_interval)
+        heartbeat.start()
+        try:
+            result = MailingServices.send_mailing(
+                mailing, pool=pool, workers=workers, rate_limiter=rate_limiter
+            )
+        except Exception as exc:
+            MailingServices.finish_job(job, error=str(exc))
+            self.stderr.write(f"Задание {job.id}: ошибка {exc}")
+        except BaseException:
+            MailingServices.requeue_job(job)
+            raise
+        else:
+            MailingServices.finish_job(job, result=result)
+            self.stdout.write(
+                f"Задание {job.id}, рассылка {mailing.id}: успешно {result['sent']}, ошибки {result['failed']}"
+            )
+        finally:
+            heartbeat.stop()
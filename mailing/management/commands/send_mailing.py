@@ -1,15 +1,85 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+import asyncio
+import signal
+import sys
 
-from mailing.models import Mailing
+from django.core.management.base import BaseCommand, CommandError
+
+from mailing.delivery import RateLimiter, SMTPConnectionPool
 from mailing.services import MailingServices
 
 
 class Command(BaseCommand):
+    help = "Отправляет все активные рассылки, у которых сейчас открыто окно start/end"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Число потоков, между которыми делятся получатели рассылки",
+        )
+        parser.add_argument(
+            "--max-rate", type=float, default=None,
+            help="Общий лимит отправки, писем в секунду",
+        )
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Отправить повторно только получателям с неуспешной последней попыткой",
+        )
+        parser.add_argument(
+            "--max-retries", type=int, default=3,
+            help="Число раундов повторной отправки для --retry-failed",
+        )
+        parser.add_argument(
+            "--backoff", type=float, default=1.0,
+            help="Пауза перед вторым раундом повтора, сек.; далее удваивается",
+        )
+        parser.add_argument(
+            "--async", action="store_true", dest="use_async",
+            help="Асинхронная отправка: все рассылки параллельно через MailingServices.asend_mailing",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=None,
+            help="Писем одновременно в асинхронном режиме",
+        )
+
     def handle(self, *args, **kwargs):
-        now = timezone.now()
-        mailings = Mailing.objects.filter(start__lte=now, end__gte=now)
+        mailings = MailingServices.active_mailings().select_related("segment")
+        workers = max(1, kwargs["workers"])
+        rate_limiter = RateLimiter(kwargs["max_rate"]) if kwargs["max_rate"] else None
 
-        for mailing in mailings:
-            MailingServices.send_mailing(mailing)
+        # SIGTERM превращается в SystemExit, чтобы буфер попыток успел сохраниться
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+        if kwargs["use_async"]:
+            if kwargs["retry_failed"]:
+                raise CommandError("--retry-failed не поддерживается в асинхронном режиме")
+            asyncio.run(self.send_async(list(mailings), kwargs["concurrency"], rate_limiter))
+            self.stdout.write(self.style.SUCCESS("Рассылки отправлены"))
+            return
+
+        # Один пул соединений на все рассылки запуска
+        with SMTPConnectionPool(size=workers) as pool:
+            for mailing in mailings:
+                if kwargs["retry_failed"]:
+                    result = MailingServices.retry_failed(
+                        mailing, pool=pool, workers=workers, rate_limiter=rate_limiter,
+                        max_retries=kwargs["max_retries"], backoff=kwargs["backoff"],
+                    )
+                else:
+                    result = MailingServices.send_mailing(
+                        mailing, pool=pool, workers=workers, rate_limiter=rate_limiter
+                    )
+                self.stdout.write(
+                    f"Рассылка {mailing.id}: успешно {result['sent']}, ошибки {result['failed']}"
+                )
         self.stdout.write(self.style.SUCCESS("Рассылки отправлены"))
+
+    async def send_async(self, mailings, concurrency, rate_limiter):
+        # Лимит --max-rate общий для всех рассылок, отправляемых параллельно
+        results = await asyncio.gather(*(
+            MailingServices.asend_mailing(mailing, concurrency=concurrency, rate_limiter=rate_limiter)
+            for mailing in mailings
+        ))
+        for mailing, result in zip(mailings, results):
+            self.stdout.write(
+                f"Рассылка {mailing.id}: успешно {result['sent']}, ошибки {result['failed']}"
+            )
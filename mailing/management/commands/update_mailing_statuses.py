@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mailing.services import MailingServices
+
+
+class Command(BaseCommand):
+    help = "Переводит статусы рассылок (Создана/Запущена/Завершена) по окну start/end одним массовым UPDATE"
+
+    def handle(self, *args, **options):
+        changed = MailingServices.transition_statuses()
+        self.stdout.write(self.style.SUCCESS(f"Обновлено статусов рассылок: {changed}"))
@@ -0,0 +1,81 @@
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+BATCH_SIZE = 5000
+
+# Код ответа из str() исключений smtplib: "(550, b'...')" или "{'a@b.ru': (550, b'...')}"
+SMTP_CODE_RE = re.compile(r"\((\d{3}),")
+
+
+def backfill_attempts(apps, schema_editor):
+    """
+    Заполняет code и recipient у существующих попыток пачками по диапазонам id.
+    Миграция не атомарная: каждая пачка фиксируется отдельно и не держит блокировку таблицы.
+    Получатель восстанавливается только для рассылок с единственным получателем.
+    """
+    MailingIsSuccess = apps.get_model('mailing', 'MailingIsSuccess')
+    Mailing = apps.get_model('mailing', 'Mailing')
+
+    single_recipient = {}
+    single_mailings = (
+        Mailing.recipients.through.objects
+        .values('mailing_id')
+        .annotate(total=Count('id'))
+        .filter(total=1)
+        .values_list('mailing_id', flat=True)
+    )
+    for mailing_id, recipient_id in (
+        Mailing.recipients.through.objects
+        .filter(mailing_id__in=single_mailings)
+        .values_list('mailing_id', 'mailingrecipients_id')
+    ):
+        single_recipient[mailing_id] = recipient_id
+
+    max_id = MailingIsSuccess.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id, BATCH_SIZE):
+        batch = MailingIsSuccess.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE)
+
+        batch.filter(status='Успешно', code__isnull=True).update(code=250)
+
+        by_code = {}
+        for pk, answer in batch.exclude(status='Успешно').filter(code__isnull=True).values_list('id', 'answer'):
+            match = SMTP_CODE_RE.search(answer)
+            if match:
+                by_code.setdefault(int(match.group(1)), []).append(pk)
+        for code, ids in by_code.items():
+            MailingIsSuccess.objects.filter(id__in=ids).update(code=code)
+
+        mailing_ids = set(
+            batch.filter(recipient__isnull=True, mailing_id__in=single_recipient)
+            .values_list('mailing_id', flat=True)
+        )
+        for mailing_id in mailing_ids:
+            batch.filter(mailing_id=mailing_id, recipient__isnull=True).update(
+                recipient_id=single_recipient[mailing_id]
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingissuccess',
+            name='code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Код ответа SMTP'),
+        ),
+        migrations.AddField(
+            model_name='mailingissuccess',
+            name='recipient',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempts', to='mailing.mailingrecipients', verbose_name='Получатель'),
+        ),
+        migrations.RunPython(backfill_attempts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0003_attempt_recipient_code'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['mailing', 'status'], name='attempt_mailing_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['mailing', 'date_mailing'], name='attempt_mailing_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['status', 'date_mailing'], name='attempt_status_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['recipient'], name='attempt_recipient_idx'),
+        ),
+    ]
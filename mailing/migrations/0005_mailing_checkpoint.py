@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0004_attempt_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Начало прогона')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание прогона')),
+                ('mailing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoint', to='mailing.mailing')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка',
+                'verbose_name_plural': 'Контрольные точки',
+                'db_table': 'MailingCheckpoint',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Начальные значения счётчиков по существующим данным"""
+    StatCounter = apps.get_model('mailing', 'StatCounter')
+    Mailing = apps.get_model('mailing', 'Mailing')
+    MailingRecipients = apps.get_model('mailing', 'MailingRecipients')
+    MailingIsSuccess = apps.get_model('mailing', 'MailingIsSuccess')
+
+    values = {
+        'total_mailings': Mailing.objects.count(),
+        'active_mailings': Mailing.objects.filter(status='Запущена').count(),
+        'unique_recipients': MailingRecipients.objects.count(),
+        'attempts_success': MailingIsSuccess.objects.filter(status='Успешно').count(),
+        'attempts_failed': MailingIsSuccess.objects.filter(status='Не успешно').count(),
+        'attempts_total': MailingIsSuccess.objects.count(),
+    }
+    StatCounter.objects.bulk_create([StatCounter(name=name, value=value) for name, value in values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0006_mailing_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+                'db_table': 'StatCounter',
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
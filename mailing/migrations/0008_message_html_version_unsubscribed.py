@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0007_stat_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingrecipients',
+            name='unsubscribed',
+            field=models.BooleanField(default=False, verbose_name='Отписан от рассылок'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='html_body',
+            field=models.TextField(blank=True, verbose_name='HTML-версия письма'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия'),
+        ),
+    ]
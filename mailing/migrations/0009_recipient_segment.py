@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # индекс по получателям строится без блокировки таблицы
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0008_message_html_version_unsubscribed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipientSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('rules', models.JSONField(blank=True, default=dict, verbose_name='Правила')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Сегмент',
+                'verbose_name_plural': 'Сегменты',
+                'db_table': 'RecipientSegment',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='mailing',
+            name='recipients',
+            field=models.ManyToManyField(blank=True, related_name='recipients', to='mailing.mailingrecipients'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingrecipients',
+            index=models.Index(fields=['owner', 'unsubscribed'], name='recipient_owner_unsub_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipientsegment',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mailings', to='mailing.recipientsegment', verbose_name='Сегмент'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Case, Max, Value, When
+
+BATCH_SIZE = 5000
+
+MAILING_STATUSES = {'Создана': 1, 'Запущена': 2, 'Завершена': 3, 'Отключена': 4}
+ATTEMPT_STATUSES = {'Успешно': 1, 'Не успешно': 2}
+
+
+def convert(model, mapping, fallback):
+    """Переносит текстовый статус в status_code одним UPDATE ... CASE на пачку id"""
+    status_code = Case(
+        *[When(status=text, then=Value(code)) for text, code in mapping.items()],
+        default=Value(fallback),
+    )
+    max_id = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id, BATCH_SIZE):
+        model.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(status_code=status_code)
+
+
+def convert_statuses(apps, schema_editor):
+    """
+    Миграция не атомарная: каждая пачка фиксируется отдельно и не держит блокировку таблицы.
+    Неизвестные значения становятся «Создана» у рассылок и «Не успешно» у попыток.
+    """
+    convert(apps.get_model('mailing', 'Mailing'), MAILING_STATUSES, 1)
+    convert(apps.get_model('mailing', 'MailingIsSuccess'), ATTEMPT_STATUSES, 2)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0010_recipient_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailing',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='mailingissuccess',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(convert_statuses, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='mailingissuccess',
+            name='attempt_mailing_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='mailingissuccess',
+            name='attempt_status_date_idx',
+        ),
+        migrations.RemoveField(
+            model_name='mailing',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='mailingissuccess',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='mailing',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.RenameField(
+            model_name='mailingissuccess',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='mailing',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Создана'), (2, 'Запущена'), (3, 'Завершена'), (4, 'Отключена')], default=1, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='mailingissuccess',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Успешно'), (2, 'Не успешно')], verbose_name='Успешно/Не успешно'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['mailing', 'status'], name='attempt_mailing_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailingissuccess',
+            index=models.Index(fields=['status', 'date_mailing'], name='attempt_status_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailing',
+            index=models.Index(condition=models.Q(('status__in', (1, 2))), fields=['start', 'end'], name='mailing_active_window_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailing',
+            index=models.Index(fields=['owner', 'status'], name='mailing_owner_status_idx'),
+        ),
+    ]
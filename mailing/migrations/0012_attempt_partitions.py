@@ -0,0 +1,134 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:06
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+from mailing.partitions import AttemptPartitions
+
+TABLE = 'MailingIsSuccess'
+LEGACY = 'MailingIsSuccess_legacy'
+DEFAULT = 'MailingIsSuccess_default'
+
+
+def next_month_start():
+    now = datetime.now(timezone.utc)
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1, tzinfo=timezone.utc)
+    return datetime(now.year, now.month + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_attempts(apps, schema_editor):
+    """
+    Превращает MailingIsSuccess в таблицу, секционированную по месяцам date_mailing, без копирования строк.
+
+    Существующая таблица становится секцией MailingIsSuccess_legacy с диапазоном до начала
+    следующего месяца. Долгие шаги — уникальный индекс (id, date_mailing) для нового первичного
+    ключа и CHECK диапазона, избавляющий ATTACH от проверки строк, — выполняются без блокировки
+    записи. Переименование и подключение секции идут в одной короткой транзакции.
+    Следующие месяцы создаёт create_partitions ниже, дальше — manage_attempt_partitions и обработчик очереди;
+    строки вне созданных секций попадают в DEFAULT и переносятся в секцию месяца при её создании.
+    """
+    connection = schema_editor.connection
+    bound = next_month_start().isoformat()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{LEGACY}_pkey" ON "{TABLE}" (id, date_mailing)'
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{LEGACY}_range" '
+            f'CHECK (date_mailing IS NOT NULL AND date_mailing < %s) NOT VALID',
+            [bound],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" VALIDATE CONSTRAINT "{LEGACY}_range"')
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = '10s'")
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+
+        # Определения вторичных индексов и внешних ключей переносятся на новую таблицу как есть
+        cursor.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND i.relname <> %s
+            """,
+            [f'"{TABLE}"', f'{LEGACY}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [f'"{TABLE}"'],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM "{TABLE}"')
+        next_id = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+        cursor.execute(f'ALTER TABLE "{LEGACY}" ALTER COLUMN id DROP IDENTITY')
+        # Ключ секционированной таблицы обязан включать date_mailing
+        cursor.execute(
+            f'ALTER TABLE "{LEGACY}" DROP CONSTRAINT "{TABLE}_pkey", '
+            f'ADD CONSTRAINT "{LEGACY}_pkey" PRIMARY KEY USING INDEX "{LEGACY}_pkey"'
+        )
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:55]}_legacy"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (date_mailing)'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" DROP CONSTRAINT "{LEGACY}_range"')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, date_mailing)')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+        # Совпадающие индексы и ключи секции подключаются к родительским без перестроения
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{LEGACY}" FOR VALUES FROM (MINVALUE) TO (%s)', [bound]
+        )
+        cursor.execute(f'ALTER TABLE "{LEGACY}" DROP CONSTRAINT "{LEGACY}_range"')
+        cursor.execute(f'CREATE TABLE "{DEFAULT}" PARTITION OF "{TABLE}" DEFAULT')
+
+
+def create_partitions(apps, schema_editor):
+    """Секции следующих месяцев создаются сразу, не дожидаясь первого запуска manage_attempt_partitions"""
+    AttemptPartitions.ensure()
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0011_integer_statuses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Успешно'), (2, 'Не успешно')], verbose_name='Успешно/Не успешно')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_summaries', to='mailing.mailing')),
+            ],
+            options={
+                'verbose_name': 'Сводка попыток за день',
+                'verbose_name_plural': 'Сводки попыток за день',
+                'db_table': 'AttemptDailySummary',
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'day', 'status'), name='attempt_summary_unique')],
+            },
+        ),
+        migrations.RunPython(partition_attempts, migrations.RunPython.noop),
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:11
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from mailing.partitions import create_partitioned_index
+
+INDEXES = [
+    models.Index(fields=['date_mailing', 'id'], name='attempt_date_id_idx'),
+    django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('answer'), name='gin_trgm_ops'), name='attempt_answer_trgm_idx'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    model = apps.get_model('mailing', 'MailingIsSuccess')
+    for index in INDEXES:
+        create_partitioned_index(schema_editor, model, index)
+
+
+def drop_indexes(apps, schema_editor):
+    model = apps.get_model('mailing', 'MailingIsSuccess')
+    for index in INDEXES:
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0012_attempt_partitions'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='mailingissuccess', index=index) for index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_counters(apps, schema_editor):
+    """Начальные значения счётчиков по журналу попыток и дневной сводке"""
+    MailingIsSuccess = apps.get_model('mailing', 'MailingIsSuccess')
+    AttemptDailySummary = apps.get_model('mailing', 'AttemptDailySummary')
+    UserAttemptCounter = apps.get_model('mailing', 'UserAttemptCounter')
+
+    totals = {}
+    raw = MailingIsSuccess.objects.values_list('mailing__owner').annotate(total=Count('id')).order_by()
+    rolled_up = AttemptDailySummary.objects.values_list('mailing__owner').annotate(total=Sum('count')).order_by()
+    for owner_id, total in [*raw, *rolled_up]:
+        totals[owner_id] = totals.get(owner_id, 0) + total
+    UserAttemptCounter.objects.bulk_create(
+        [UserAttemptCounter(user_id=user_id, value=value) for user_id, value in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0013_attempt_keyset_trgm_indexes'),
+        ('users', '0002_outbox_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAttemptCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='attempt_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0, verbose_name='Попыток рассылок')),
+            ],
+            options={
+                'verbose_name': 'Счётчик попыток пользователя',
+                'verbose_name_plural': 'Счётчики попыток пользователей',
+                'db_table': 'UserAttemptCounter',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
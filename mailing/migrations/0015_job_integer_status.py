@@ -0,0 +1,59 @@
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+JOB_STATUSES = {'В очереди': 1, 'Выполняется': 2, 'Выполнено': 3, 'Ошибка': 4}
+
+
+def convert_statuses(apps, schema_editor):
+    """Переносит текстовый статус заданий в status_code; неизвестные значения становятся «Ошибка»"""
+    MailingJob = apps.get_model('mailing', 'MailingJob')
+    MailingJob.objects.update(status_code=Case(
+        *[When(status=text, then=Value(code)) for text, code in JOB_STATUSES.items()],
+        default=Value(4),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0014_user_attempt_counter'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='mailingjob',
+            name='job_active_mailing_unique',
+        ),
+        migrations.RemoveIndex(
+            model_name='mailingjob',
+            name='job_status_created_idx',
+        ),
+        migrations.AddField(
+            model_name='mailingjob',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(convert_statuses, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='mailingjob',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='mailingjob',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='mailingjob',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'В очереди'), (2, 'Выполняется'), (3, 'Выполнено'), (4, 'Ошибка')], default=1, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingjob',
+            index=models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mailingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', [1, 2])), fields=('mailing',), name='job_active_mailing_unique'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 
@@ -19,6 +21,10 @@ class MailingRecipients(models.Model):
     comment = models.TextField(
         verbose_name='Comment',
     )
+    unsubscribed = models.BooleanField(
+        default=False,
+        verbose_name='Отписан от рассылок',
+    )
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -38,6 +44,70 @@ class MailingRecipients(models.Model):
         permissions = [
             ("can_manage_recipients", "Может управлять всеми получателями"),
         ]
+        indexes = [
+            # состав и размер сегментов считаются по получателям владельца
+            models.Index(fields=["owner", "unsubscribed"], name="recipient_owner_unsub_idx"),
+            # поиск по началу строки (istartswith -> UPPER(...) LIKE 'q%') в форме рассылки
+            models.Index(OpClass(Upper("email"), name="text_pattern_ops"), name="recipient_email_prefix_idx"),
+            models.Index(OpClass(Upper("full_name"), name="text_pattern_ops"), name="recipient_name_prefix_idx"),
+        ]
+
+
+class RecipientSegment(models.Model):
+    """Сегмент получателей: состав задаётся правилами и вычисляется в момент отправки"""
+
+    # правило -> lookup по полям MailingRecipients
+    RULES = {
+        "email_domain": "email__iendswith",
+        "email_contains": "email__icontains",
+        "full_name_contains": "full_name__icontains",
+        "comment_contains": "comment__icontains",
+    }
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name='Название',
+    )
+    rules = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Правила',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создан',
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="segments",
+    )
+
+    def __str__(self):
+        return self.name
+
+    def get_filter(self):
+        """Условие на MailingRecipients: получатели владельца, подходящие под все правила"""
+        lookups = {}
+        for rule, value in self.rules.items():
+            if rule not in self.RULES or not value:
+                continue
+            if rule == "email_domain":
+                value = "@" + value.lstrip("@")
+            lookups[self.RULES[rule]] = value
+        return models.Q(owner_id=self.owner_id, **lookups)
+
+    def get_recipients(self):
+        """Получатели владельца, подходящие под все правила; без правил — все получатели владельца"""
+        return MailingRecipients.objects.filter(self.get_filter())
+
+    class Meta:
+        verbose_name = "Сегмент"
+        verbose_name_plural = "Сегменты"
+        ordering = [
+            "name",
+        ]
+        db_table = "RecipientSegment"
 
 
 class Message(models.Model):
@@ -50,6 +120,15 @@ class Message(models.Model):
     body = models.TextField(
         verbose_name='Тело письма',
     )
+    html_body = models.TextField(
+        blank=True,
+        verbose_name='HTML-версия письма',
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия',
+    )
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -59,6 +138,15 @@ class Message(models.Model):
     def __str__(self):
         return self.header
 
+    def save(self, *args, **kwargs):
+        # Версия входит в ключ кеша скомпилированных шаблонов (mailing.rendering.TemplateCache)
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Текст"
         verbose_name_plural = "Текст"
@@ -71,6 +159,29 @@ class Message(models.Model):
         ]
 
 
+class MailingStatus(models.IntegerChoices):
+    CREATED = 1, 'Создана'
+    RUNNING = 2, 'Запущена'
+    FINISHED = 3, 'Завершена'
+    DISABLED = 4, 'Отключена'
+
+
+# Рассылки, которые ещё могут отправляться: по ним строится частичный индекс окна start/end
+ACTIVE_MAILING_STATUSES = (MailingStatus.CREATED, MailingStatus.RUNNING)
+
+
+class AttemptStatus(models.IntegerChoices):
+    SUCCESS = 1, 'Успешно'
+    FAILED = 2, 'Не успешно'
+
+
+class JobStatus(models.IntegerChoices):
+    QUEUED = 1, 'В очереди'
+    RUNNING = 2, 'Выполняется'
+    DONE = 3, 'Выполнено'
+    FAILED = 4, 'Ошибка'
+
+
 class Mailing(models.Model):
     """Инфо о рассылки"""
 
@@ -80,10 +191,10 @@ class Mailing(models.Model):
     end = models.DateTimeField(
         verbose_name='Конец'
     )
-    status = models.CharField(
-        max_length=10,
+    status = models.PositiveSmallIntegerField(
+        choices=MailingStatus.choices,
         verbose_name='Статус',
-        default="Создана"
+        default=MailingStatus.CREATED
     )
     message = models.ForeignKey(
         Message,
@@ -92,8 +203,17 @@ class Mailing(models.Model):
     )
     recipients = models.ManyToManyField(
         MailingRecipients,
+        blank=True,
         related_name='recipients'
     )
+    segment = models.ForeignKey(
+        RecipientSegment,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='mailings',
+        verbose_name='Сегмент',
+    )
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -101,7 +221,25 @@ class Mailing(models.Model):
     )
 
     def __str__(self):
-        return f"Рассылка {self.id}, {self.status}"
+        return f"Рассылка {self.id}, {self.get_status_display()}"
+
+    @property
+    def current_status_label(self):
+        """Название статуса из аннотации current_status (MailingServices.with_current_status)"""
+        return MailingStatus(self.current_status).label
+
+    def get_recipients(self):
+        """Получатели рассылки: сегмент, если он задан, иначе явно выбранные получатели"""
+        if self.segment_id:
+            return self.segment.get_recipients()
+        return self.recipients.all()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигналы пересчитывают счётчик активных рассылок
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
 
     def clean(self):
         now = timezone.now()
@@ -122,30 +260,61 @@ class Mailing(models.Model):
             ("can_disable_mailing", "Может отключать рассылку"),
             ("can_view_all_mailings", "Может просматривать все рассылки"),
         ]
+        indexes = [
+            # планировщик и фильтр статусов: активные рассылки, чьё окно открыто сейчас
+            models.Index(
+                fields=["start", "end"],
+                name="mailing_active_window_idx",
+                condition=models.Q(status__in=ACTIVE_MAILING_STATUSES),
+            ),
+            models.Index(fields=["owner", "status"], name="mailing_owner_status_idx"),
+        ]
 
 
 class MailingIsSuccess(models.Model):
-    """Попытка рассылки"""
+    """
+    Попытка рассылки.
+
+    Таблица секционирована по месяцам date_mailing (миграция 0012, секции ведёт
+    mailing.partitions.AttemptPartitions), первичный ключ в базе — (id, date_mailing).
+    Новые индексы создаются по секциям через mailing.partitions.create_partitioned_index
+    (AddIndexConcurrently на секционированной таблице недоступен).
+    """
 
     date_mailing = models.DateTimeField(
         auto_now_add=True
     )
-    status = models.CharField(
-        max_length=10,
+    status = models.PositiveSmallIntegerField(
+        choices=AttemptStatus.choices,
         verbose_name='Успешно/Не успешно'
     )
     answer = models.CharField(
         max_length=500,
         verbose_name='Ответ почтового сервера'
     )
+    code = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Код ответа SMTP'
+    )
     mailing = models.ForeignKey(
         Mailing,
         on_delete=models.CASCADE,
         related_name='attempts'
     )
+    recipient = models.ForeignKey(
+        MailingRecipients,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='attempts',
+        verbose_name='Получатель',
+        # индекс создаётся в Meta.indexes без блокировки таблицы
+        db_index=False
+    )
 
     def __str__(self):
-        return f"Попытка {self.id}, {self.status}"
+        return f"Попытка {self.id}, {self.get_status_display()}"
 
     class Meta:
         verbose_name = "Попытка"
@@ -154,3 +323,186 @@ class MailingIsSuccess(models.Model):
             "date_mailing",
         ]
         db_table = "MailingIsSuccess"
+        indexes = [
+            models.Index(fields=["mailing", "status"], name="attempt_mailing_status_idx"),
+            models.Index(fields=["mailing", "date_mailing"], name="attempt_mailing_date_idx"),
+            models.Index(fields=["status", "date_mailing"], name="attempt_status_date_idx"),
+            models.Index(fields=["recipient"], name="attempt_recipient_idx"),
+            # постраничный вывод по ключу (date_mailing, id) от новых к старым
+            models.Index(fields=["date_mailing", "id"], name="attempt_date_id_idx"),
+            # поиск по ответу сервера в админке: UPPER(answer) LIKE UPPER('%...%')
+            GinIndex(OpClass(Upper("answer"), name="gin_trgm_ops"), name="attempt_answer_trgm_idx"),
+        ]
+
+
+class AttemptDailySummary(models.Model):
+    """Попытки рассылки за день по статусам: остаются после удаления старых секций журнала попыток"""
+
+    day = models.DateField(
+        verbose_name='День'
+    )
+    mailing = models.ForeignKey(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name='attempt_summaries'
+    )
+    status = models.PositiveSmallIntegerField(
+        choices=AttemptStatus.choices,
+        verbose_name='Успешно/Не успешно'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+
+    def __str__(self):
+        return f"Рассылка {self.mailing_id}, {self.day}: {self.get_status_display()} {self.count}"
+
+    class Meta:
+        verbose_name = "Сводка попыток за день"
+        verbose_name_plural = "Сводки попыток за день"
+        ordering = [
+            "day",
+        ]
+        db_table = "AttemptDailySummary"
+        constraints = [
+            models.UniqueConstraint(fields=["mailing", "day", "status"], name="attempt_summary_unique"),
+        ]
+
+
+class MailingCheckpoint(models.Model):
+    """Контрольная точка прогона рассылки"""
+
+    mailing = models.OneToOneField(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name='checkpoint'
+    )
+    started_at = models.DateTimeField(
+        verbose_name='Начало прогона'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Окончание прогона'
+    )
+
+    def __str__(self):
+        return f"Прогон рассылки {self.mailing_id} с {self.started_at}"
+
+    class Meta:
+        verbose_name = "Контрольная точка"
+        verbose_name_plural = "Контрольные точки"
+        db_table = "MailingCheckpoint"
+
+
+class MailingJob(models.Model):
+    """Задание на отправку рассылки в очереди"""
+
+    mailing = models.ForeignKey(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name='jobs'
+    )
+    status = models.PositiveSmallIntegerField(
+        choices=JobStatus.choices,
+        default=JobStatus.QUEUED,
+        verbose_name='Статус'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Обработчик'
+    )
+    sent = models.PositiveIntegerField(
+        default=0
+    )
+    failed = models.PositiveIntegerField(
+        default=0
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+
+    def __str__(self):
+        return f"Задание {self.id}, {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Задание"
+        verbose_name_plural = "Задания"
+        ordering = [
+            "created_at",
+        ]
+        db_table = "MailingJob"
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="job_status_created_idx"),
+        ]
+        constraints = [
+            # У рассылки не больше одного ожидающего или выполняемого задания
+            models.UniqueConstraint(
+                fields=["mailing"],
+                condition=models.Q(status__in=[JobStatus.QUEUED, JobStatus.RUNNING]),
+                name="job_active_mailing_unique",
+            ),
+        ]
+
+
+class StatCounter(models.Model):
+    """Счётчик статистики для главной страницы, обновляется инкрементально"""
+
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Счётчик'
+    )
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name='Значение'
+    )
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        verbose_name = "Счётчик"
+        verbose_name_plural = "Счётчики"
+        db_table = "StatCounter"
+
+
+class UserAttemptCounter(models.Model):
+    """Число попыток рассылок пользователя: обновляется при записи попыток, сверяется reconcile_stats"""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='attempt_counter'
+    )
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name='Попыток рассылок'
+    )
+
+    def __str__(self):
+        return f"{self.user_id}: {self.value}"
+
+    class Meta:
+        verbose_name = "Счётчик попыток пользователя"
+        verbose_name_plural = "Счётчики попыток пользователей"
+        db_table = "UserAttemptCounter"
@@ -0,0 +1,195 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone as django_timezone
+
+from .models import AttemptDailySummary, MailingIsSuccess
+
+TABLE = MailingIsSuccess._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+SUMMARY_TABLE = AttemptDailySummary._meta.db_table
+
+# FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00'), нижняя граница может быть MINVALUE
+BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(value, months=0):
+    """Начало месяца value (UTC), сдвинутого на months"""
+    value = value.astimezone(timezone.utc)
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start):
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def _parse_bound(value):
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def create_partitioned_index(schema_editor, model, index):
+    """
+    Индекс на секционированной таблице без блокировки записи, для RunPython в неатомарной миграции.
+    CREATE INDEX CONCURRENTLY на секционированной таблице недоступен, поэтому индекс создаётся
+    на самой таблице (ON ONLY, пустой и невалидный), затем CONCURRENTLY на каждой секции
+    и подключается к родительскому; родительский становится валидным, когда подключены все секции.
+    """
+    table = model._meta.db_table
+    statement = str(index.create_sql(model, schema_editor))
+    on_table = f"ON {schema_editor.quote_name(table)}"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(statement.replace(on_table, f"ON ONLY {schema_editor.quote_name(table)}", 1))
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [schema_editor.quote_name(table)],
+        )
+        for (partition,) in cursor.fetchall():
+            name = f"{partition}_{index.name}"[:63]
+            partition_statement = (
+                statement
+                .replace(schema_editor.quote_name(index.name), schema_editor.quote_name(name), 1)
+                .replace(on_table, f"ON {schema_editor.quote_name(partition)}", 1)
+                .replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+            )
+            cursor.execute(partition_statement)
+            cursor.execute(
+                f"ALTER INDEX {schema_editor.quote_name(index.name)} ATTACH PARTITION {schema_editor.quote_name(name)}"
+            )
+
+
+class AttemptPartitions:
+    """
+    Месячные секции журнала попыток MailingIsSuccess.
+
+    Секции создаются заранее отдельной таблицей и подключаются ATTACH PARTITION:
+    в отличие от CREATE TABLE ... PARTITION OF, это не блокирует запись в журнал.
+    Секции старше срока хранения сворачиваются в AttemptDailySummary, отключаются
+    и удаляются в одной транзакции: сводка и журнал не считают попытки дважды,
+    а удаление секции не оставляет мёртвых строк, как DELETE.
+    """
+
+    @staticmethod
+    def partitions():
+        """Подключённые секции с диапазонами [(имя, начало или None, конец)], кроме DEFAULT"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                """,
+                [f'"{TABLE}"'],
+            )
+            rows = cursor.fetchall()
+        partitions = []
+        for name, bound in rows:
+            match = BOUND_RE.search(bound)
+            if match is None:
+                continue
+            partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+        return sorted(partitions, key=lambda partition: partition[2])
+
+    @staticmethod
+    def default_months():
+        """Начала месяцев, попытки которых лежат в DEFAULT-секции (секция месяца не была создана вовремя)"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT date_trunc('month', date_mailing AT TIME ZONE 'UTC')
+                FROM "{DEFAULT_PARTITION}"
+                """
+            )
+            return sorted(month.replace(tzinfo=timezone.utc) for (month,) in cursor.fetchall())
+
+    @staticmethod
+    def ensure(now=None, ahead=None):
+        """
+        Создаёт секции текущего и ahead следующих месяцев, а также месяцев с попытками в DEFAULT-секции,
+        которых ещё нет; возвращает имена созданных
+        """
+        now = now or django_timezone.now()
+        if ahead is None:
+            ahead = getattr(settings, 'MAILING_ATTEMPT_PARTITIONS_AHEAD', 2)
+        existing = AttemptPartitions.partitions()
+        starts = {month_start(now, months) for months in range(ahead + 1)}
+        starts.update(AttemptPartitions.default_months())
+        created = []
+        for start in sorted(starts):
+            end = month_start(start, 1)
+            # Диапазон уже покрыт, например секцией legacy, которая заканчивается в начале следующего месяца
+            if any((lower is None or lower < end) and start < upper for _, lower, upper in existing):
+                continue
+            AttemptPartitions.create(start, end)
+            created.append(partition_name(start))
+        return created
+
+    @staticmethod
+    def create(start, end):
+        """
+        Создаёт секцию [start, end) и подключает её.
+        ATTACH не пройдёт, пока в DEFAULT-секции есть строки диапазона, поэтому они переносятся
+        в новую секцию в той же транзакции; DEFAULT блокируется до конца транзакции, чтобы за это время
+        в неё не попали новые строки диапазона. Обычно DEFAULT пуста и перенос ничего не делает.
+        """
+        name = partition_name(start)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = '5s'")
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM "{DEFAULT_PARTITION}" WHERE date_mailing >= %s AND date_mailing < %s RETURNING *
+                )
+                INSERT INTO "{name}" SELECT * FROM moved
+                """,
+                [start.isoformat(), end.isoformat()],
+            )
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+                [start.isoformat(), end.isoformat()],
+            )
+
+    @staticmethod
+    def expired(now=None, retention_days=None):
+        """Секции, все попытки которых старше срока хранения"""
+        now = now or django_timezone.now()
+        if retention_days is None:
+            retention_days = getattr(settings, 'MAILING_ATTEMPT_RETENTION_DAYS', 180)
+        cutoff = now - timedelta(days=retention_days)
+        return [partition for partition in AttemptPartitions.partitions() if partition[2] <= cutoff]
+
+    @staticmethod
+    def drop(name):
+        """
+        Сворачивает попытки секции по дням в AttemptDailySummary, отключает и удаляет её; возвращает число попыток.
+        Свёртка читает саму секцию и не блокирует журнал; DETACH берёт исключительную блокировку
+        всего журнала, поэтому он и DROP идут последними и держат её только до конца транзакции.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH rolled AS (
+                    SELECT (date_mailing AT TIME ZONE 'UTC')::date AS day, mailing_id, status, COUNT(*) AS count
+                    FROM "{name}"
+                    GROUP BY 1, 2, 3
+                ), saved AS (
+                    INSERT INTO "{SUMMARY_TABLE}" (day, mailing_id, status, count)
+                    SELECT day, mailing_id, status, count FROM rolled
+                    ON CONFLICT (mailing_id, day, status)
+                    DO UPDATE SET count = "{SUMMARY_TABLE}".count + EXCLUDED.count
+                )
+                SELECT COALESCE(SUM(count), 0) FROM rolled
+                """
+            )
+            total = cursor.fetchone()[0]
+            cursor.execute("SET LOCAL lock_timeout = '5s'")
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        return total
@@ -0,0 +1,289 @@
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.core.signing import BadSignature, Signer
+from django.urls import reverse
+from django.utils.html import escape
+
+# Подстановки, доступные в теме и тексте письма: {{ full_name }}, {{ email }}, {{ unsubscribe_url }}
+PLACEHOLDERS = ('full_name', 'email', 'unsubscribe_url')
+PLACEHOLDER_RE = re.compile(r'{{\s*(\w+)\s*}}')
+
+UNSUBSCRIBE_SALT = 'mailing.unsubscribe'
+
+
+def unknown_placeholders(text):
+    """Имена подстановок в тексте, которых нет в PLACEHOLDERS"""
+    return sorted({name for name in PLACEHOLDER_RE.findall(text) if name not in PLACEHOLDERS})
+
+
+def unsubscribe_token(recipient_id):
+    return Signer(salt=UNSUBSCRIBE_SALT).sign(str(recipient_id))
+
+
+def unsubscribe_recipient_id(token):
+    """id получателя из подписанного токена или None, если подпись неверна"""
+    try:
+        return int(Signer(salt=UNSUBSCRIBE_SALT).unsign(token))
+    except (BadSignature, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def _unsubscribe_url_parts():
+    # reverse() на каждого получателя дороже самого рендера: шаблон адреса вычисляется один раз
+    prefix, suffix = reverse('mailing:unsubscribe', kwargs={'token': 'TOKEN'}).split('TOKEN')
+    return getattr(settings, 'SITE_URL', '').rstrip('/') + prefix, suffix
+
+
+def unsubscribe_url(recipient_id):
+    prefix, suffix = _unsubscribe_url_parts()
+    return f"{prefix}{unsubscribe_token(recipient_id)}{suffix}"
+
+
+class CompiledTemplate:
+    """
+    Текст, один раз разобранный на литералы и подстановки.
+    Рендер — замена подстановок в готовом списке частей и одна склейка строк,
+    без разбора шаблона и без контекста Django на каждого получателя.
+    Неизвестные подстановки остаются в тексте как есть.
+    """
+
+    def __init__(self, source):
+        self.parts = []
+        self.slots = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(source):
+            name = match.group(1)
+            if name not in PLACEHOLDERS:
+                continue
+            self.parts.append(source[position:match.start()])
+            self.slots.append((len(self.parts), name))
+            self.parts.append('')
+            position = match.end()
+        self.parts.append(source[position:])
+
+    def render(self, values):
+        parts = self.parts[:]
+        for index, name in self.slots:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+
+class CompiledMessage:
+    """Тема, текст и HTML-версия сообщения, скомпилированные для персонализации"""
+
+    def __init__(self, message):
+        self.subject = CompiledTemplate(message.header)
+        self.text = CompiledTemplate(message.body)
+        self.html = CompiledTemplate(message.html_body) if message.html_body else None
+
+    @staticmethod
+    def values(recipient, unsubscribe):
+        return {
+            'full_name': recipient.full_name,
+            'email': recipient.email,
+            'unsubscribe_url': unsubscribe,
+        }
+
+    def render_subject(self, values):
+        # Перевод строки в теме письма Django считает попыткой подмены заголовков
+        return ' '.join(self.subject.render(values).split())
+
+    def render(self, recipient, unsubscribe):
+        """Возвращает (тема, текст, html или None) для получателя с полями email и full_name"""
+        values = self.values(recipient, unsubscribe)
+        subject = self.render_subject(values)
+        html = None
+        if self.html is not None:
+            html = self.html.render({name: escape(value) for name, value in values.items()})
+        return subject, self.text.render(values), html
+
+
+def build_email(compiled, recipient, from_email):
+    """Персональное письмо получателю, собранное целиком (без подготовленного MIME)"""
+    unsubscribe = unsubscribe_url(recipient.id)
+    subject, text, html = compiled.render(recipient, unsubscribe)
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=from_email,
+        to=[recipient.email],
+        headers={'List-Unsubscribe': f'<{unsubscribe}>'},
+    )
+    if html is not None:
+        email.attach_alternative(html, 'text/html')
+    return email
+
+
+class PreparedMIME:
+    """Готовые байты письма вместо MIME-объекта: почтовому бэкенду нужен только as_bytes()"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return self.data if linesep == '\r\n' else self.data.replace(b'\r\n', linesep.encode())
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode()
+
+    def get_charset(self):
+        return None
+
+
+class PreparedEmail(EmailMultiAlternatives):
+    """
+    Письмо с заранее собранным MIME: message() не кодирует его заново.
+    Текст и HTML есть только в MIME, body и alternatives не заполняются.
+    """
+
+    def __init__(self, mime, **kwargs):
+        super().__init__(**kwargs)
+        self.mime = mime
+
+    def message(self):
+        return self.mime
+
+
+class PreparedMessage:
+    """
+    Письмо рассылки, закодированное один раз на всю отправку.
+
+    Сообщение собирается и кодируется Django один раз с маркерами вместо
+    получателя, Message-ID, даты, темы и подстановок, после чего байты письма
+    разбиваются по маркерам. На каждого получателя остаётся склеить части
+    с его значениями — без повторной сборки MIME, кодировки тела и свёртки заголовков.
+
+    Части текста объявляются 8bit: шаблон может быть в ASCII (7bit), а значения получателя — нет.
+    Если тело пришлось кодировать quoted-printable (строки длиннее 998 байт)
+    или MAILING_PREPARED_MESSAGES выключен, письма собираются целиком (build_email).
+    """
+
+    def __init__(self, compiled, from_email, enabled=None):
+        self.compiled = compiled
+        self.from_email = from_email
+        if enabled is None:
+            enabled = getattr(settings, 'MAILING_PREPARED_MESSAGES', True)
+        self.parts = self._prepare() if enabled else None
+
+    def _prepare(self):
+        token = uuid.uuid4().hex[:12]
+
+        def marker(kind, name=''):
+            return f'{token}{kind}{name}{token}'
+
+        email = EmailMultiAlternatives(
+            subject=marker('S'),
+            body=self.compiled.text.render({name: marker('T', name) for name in PLACEHOLDERS}),
+            from_email=self.from_email,
+            to=[marker('R')],
+            headers={
+                'To': marker('R'),
+                'Date': marker('D'),
+                'Message-ID': marker('M'),
+                'List-Unsubscribe': f"<{marker('U')}>",
+            },
+        )
+        expected = 5 + len(self.compiled.text.slots)
+        if self.compiled.html is not None:
+            email.attach_alternative(
+                self.compiled.html.render({name: marker('H', name) for name in PLACEHOLDERS}), 'text/html'
+            )
+            expected += len(self.compiled.html.slots)
+
+        message = email.message()
+        for part in message.walk():
+            encoding = part.get('Content-Transfer-Encoding')
+            if encoding == '7bit':
+                part.replace_header('Content-Transfer-Encoding', '8bit')
+            elif encoding not in (None, '8bit'):
+                # В quoted-printable значения пришлось бы кодировать так же, как тело
+                return None
+        data = message.as_bytes(linesep='\r\n')
+        parts = re.split(rb'%s(\w)(\w*?)%s' % (token.encode(), token.encode()), data)
+        # split даёт литерал, вид маркера, имя, литерал, ...
+        if (len(parts) - 1) // 3 != expected:
+            return None
+        return parts
+
+    def build(self, recipient):
+        """Письмо получателю с полями id, email и full_name"""
+        if self.parts is None:
+            return build_email(self.compiled, recipient, self.from_email)
+
+        unsubscribe = unsubscribe_url(recipient.id)
+        values = self.compiled.values(recipient, unsubscribe)
+        subject = self.compiled.render_subject(values)
+        headers = {
+            b'S': subject if subject.isascii() else Header(subject, 'utf-8').encode(linesep='\r\n'),
+            b'R': sanitize_address(recipient.email, 'utf-8'),
+            b'D': formatdate(localtime=settings.EMAIL_USE_LOCALTIME),
+            b'M': make_msgid(domain=DNS_NAME),
+            b'U': unsubscribe,
+        }
+
+        parts = self.parts[:]
+        for index in range(1, len(parts), 3):
+            kind, name = parts[index], parts[index + 1].decode()
+            if kind == b'T':
+                value = values[name]
+            elif kind == b'H':
+                value = escape(values[name])
+            else:
+                value = headers[kind]
+            # Тело уже в формате CRLF, одиночный перевод строки из значения его бы нарушил
+            parts[index] = value.replace('\r\n', '\n').replace('\n', '\r\n').encode()
+            parts[index + 1] = b''
+
+        return PreparedEmail(
+            PreparedMIME(b''.join(parts)),
+            subject=subject,
+            from_email=self.from_email,
+            to=[recipient.email],
+        )
+
+
+class TemplateCache:
+    """
+    LRU-кеш скомпилированных сообщений по ключу (id, версия).
+    Изменение сообщения увеличивает его версию, поэтому устаревшая запись
+    просто перестаёт запрашиваться и со временем вытесняется.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, 'MAILING_TEMPLATE_CACHE_SIZE', 128)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, message):
+        key = (message.pk, message.version)
+        with self._lock:
+            compiled = self._items.get(key)
+            if compiled is not None:
+                self._items.move_to_end(key)
+                return compiled
+
+        compiled = CompiledMessage(message)
+        with self._lock:
+            self._items[key] = compiled
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+template_cache = TemplateCache()
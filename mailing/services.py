@@ -1,7 +1,156 @@
-from django.core.mail import send_mail
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, OuterRef, PositiveSmallIntegerField, Subquery, Value, When
 from django.utils import timezone
 
-from .models import MailingIsSuccess
+from core.cache import bump_version
+from core.utils import keyset_rows
+
+from .delivery import SMTP_OK, DomainRateLimiter, SMTPConnectionPool, email_domain, smtp_code
+from .models import (ACTIVE_MAILING_STATUSES, AttemptStatus, JobStatus, Mailing, MailingCheckpoint, MailingIsSuccess,
+                     MailingJob, MailingStatus, Message)
+from .rendering import PreparedMessage, template_cache
+from .stats import StatsServices
+
+RECIPIENT_FIELDS = ('id', 'email', 'full_name')
+
+
+class AttemptBuffer:
+    """
+    Буфер попыток рассылки: записи MailingIsSuccess копятся в памяти
+    и сохраняются через bulk_create пачками по batch_size.
+    При выходе из контекста (в том числе по исключению) остаток сохраняется.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'MAILING_ATTEMPT_BATCH_SIZE', 500)
+        self._items = []
+        self._lock = threading.Lock()
+
+    def add(self, **fields):
+        with self._lock:
+            self._items.append(MailingIsSuccess(**fields))
+            if len(self._items) < self.batch_size:
+                return
+            batch, self._items = self._items, []
+        self._save(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._items = self._items, []
+        self._save(batch)
+
+    def _save(self, batch):
+        if batch:
+            with transaction.atomic():
+                MailingIsSuccess.objects.bulk_create(batch, batch_size=self.batch_size)
+                StatsServices.record_attempts(batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+class LockedIterator:
+    """Потокобезопасная обёртка итератора: каждый элемент достаётся ровно одному потоку"""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._iterator)
+
+
+class DomainScheduler:
+    """
+    Порядок отправки с чередованием доменов получателей.
+
+    Из потока recipients читается окно до window получателей, они раскладываются
+    по очередям доменов и выдаются по кругу (mail.ru, gmail.com, yandex.ru, mail.ru, ...),
+    так что письма одному домену не идут пачкой. Домен, у которого limiter
+    не дал токен, пропускается до следующего круга; если ждут все домены окна,
+    поток спит до ближайшего токена. recipients может быть и асинхронным итератором:
+    тогда планировщик перебирается через async for, ждёт токен через asyncio.sleep,
+    а синхронный limiter (запрос к Redis) вызывается в потоке, не блокируя event loop.
+    """
+
+    def __init__(self, recipients, limiter=None, window=None):
+        self.recipients = recipients
+        self.limiter = limiter if limiter is not None and limiter.enabled else None
+        self.window = window or getattr(settings, 'MAILING_RECIPIENT_CHUNK_SIZE', 2000)
+        self.queues = OrderedDict()
+        self.buffered = 0
+
+    def _add(self, recipient):
+        self.queues.setdefault(email_domain(recipient.email), deque()).append(recipient)
+        self.buffered += 1
+
+    def _take(self):
+        """(получатель, 0), если какой-то домен окна дал токен, иначе (None, пауза до ближайшего токена)"""
+        delays = []
+        for _ in range(len(self.queues)):
+            domain, queue = next(iter(self.queues.items()))
+            self.queues.move_to_end(domain)
+            delay = self.limiter.acquire(domain) if self.limiter else 0
+            if delay:
+                delays.append(delay)
+                continue
+            recipient = queue.popleft()
+            self.buffered -= 1
+            if not queue:
+                del self.queues[domain]
+            return recipient, 0
+        return None, min(delays)
+
+    def __iter__(self):
+        recipients = iter(self.recipients)
+        while True:
+            while self.buffered < self.window:
+                recipient = next(recipients, None)
+                if recipient is None:
+                    break
+                self._add(recipient)
+            if not self.queues:
+                return
+            recipient, delay = self._take()
+            if recipient is None:
+                time.sleep(delay)
+                continue
+            yield recipient
+
+    async def __aiter__(self):
+        recipients = aiter(self.recipients)
+        while True:
+            while self.buffered < self.window:
+                recipient = await anext(recipients, None)
+                if recipient is None:
+                    break
+                self._add(recipient)
+            if not self.queues:
+                return
+            if self.limiter is None:
+                recipient, delay = self._take()
+            else:
+                recipient, delay = await sync_to_async(self._take, thread_sensitive=False)()
+            if recipient is None:
+                await asyncio.sleep(delay)
+                continue
+            yield recipient
 
 
 class MailingServices:
@@ -9,15 +158,15 @@ class MailingServices:
     def calculate_status(mailing):
         now = timezone.now()
         if now < mailing.start:
-            return 'Создана'
+            return MailingStatus.CREATED
         if mailing.start <= now <= mailing.end:
-            return 'Запущена'
-        return 'Завершена'
+            return MailingStatus.RUNNING
+        return MailingStatus.FINISHED
 
     @staticmethod
     def update_mailing_status(mailing):
 
-        if mailing.status == "Отключена":
+        if mailing.status == MailingStatus.DISABLED:
             return mailing.status
 
         new_status = MailingServices.calculate_status(mailing)
@@ -26,10 +175,83 @@ class MailingServices:
             mailing.save(update_fields=['status'])
         return new_status
 
+    @staticmethod
+    def status_expression(now=None):
+        """Статус рассылки по окну start/end, вычисляемый в БД (без учёта отключения)"""
+        now = now or timezone.now()
+        return Case(
+            When(start__gt=now, then=Value(MailingStatus.CREATED)),
+            When(end__lt=now, then=Value(MailingStatus.FINISHED)),
+            default=Value(MailingStatus.RUNNING),
+            output_field=PositiveSmallIntegerField(),
+        )
+
+    @staticmethod
+    def with_current_status(queryset, now=None):
+        """Аннотирует current_status — актуальный статус рассылки, чтение ничего не записывает"""
+        return queryset.annotate(current_status=Case(
+            When(status=MailingStatus.DISABLED, then=Value(MailingStatus.DISABLED)),
+            default=MailingServices.status_expression(now),
+            output_field=PositiveSmallIntegerField(),
+        ))
+
+    @staticmethod
+    def filter_by_status(queryset, status, now=None):
+        """
+        Фильтр по актуальному статусу. Статус окна выражается условиями на start/end,
+        поэтому результат верен, даже если сохранённый статус ещё не обновлён.
+        Созданные и запущенные ищутся по частичному индексу mailing_active_window_idx.
+        """
+        now = now or timezone.now()
+        if status == MailingStatus.DISABLED:
+            return queryset.filter(status=MailingStatus.DISABLED)
+        if status == MailingStatus.CREATED:
+            return queryset.filter(status__in=ACTIVE_MAILING_STATUSES, start__gt=now)
+        if status == MailingStatus.RUNNING:
+            return queryset.filter(status__in=ACTIVE_MAILING_STATUSES, start__lte=now, end__gte=now)
+        if status == MailingStatus.FINISHED:
+            return queryset.exclude(status=MailingStatus.DISABLED).filter(end__lt=now)
+        return queryset.none()
+
+    @staticmethod
+    def active_mailings(now=None):
+        """
+        Рассылки, которые нужно отправлять сейчас: не отключены и не завершены, окно start/end открыто.
+        Условие на статус обязательно: без него частичный индекс mailing_active_window_idx не используется.
+        """
+        now = now or timezone.now()
+        return Mailing.objects.filter(status__in=ACTIVE_MAILING_STATUSES, start__lte=now, end__gte=now)
+
+    @staticmethod
+    def transition_statuses(now=None):
+        """
+        Приводит сохранённые статусы рассылок к актуальным одним массовым UPDATE.
+        update() не вызывает сигналы, поэтому счётчик активных рассылок
+        и версия кеша страниц рассылок обновляются здесь. Возвращает число изменённых рассылок.
+        """
+        now = now or timezone.now()
+        current = MailingServices.status_expression(now)
+        with transaction.atomic():
+            changed = list(
+                Mailing.objects.exclude(status=MailingStatus.DISABLED)
+                .annotate(new_status=current)
+                .exclude(status=F('new_status'))
+                .select_for_update()
+                .values_list('pk', 'status', 'new_status')
+            )
+            if not changed:
+                return 0
+            Mailing.objects.filter(pk__in=[pk for pk, _, _ in changed]).update(status=current)
+            StatsServices.increment(active_mailings=sum(
+                (new == MailingStatus.RUNNING) - (old == MailingStatus.RUNNING) for _, old, new in changed
+            ))
+        bump_version(Mailing)
+        return len(changed)
+
     @staticmethod
     def can_send_now(mailing):
         now = timezone.now()
-        if mailing.status == "Отключена" or mailing.status == "Завершена":
+        if mailing.status in (MailingStatus.DISABLED, MailingStatus.FINISHED):
             return False, "Рассылка была отключена менеджером."
 
         if not (mailing.start <= now <= mailing.end):
@@ -38,39 +260,364 @@ class MailingServices:
         return True, None
 
     @staticmethod
-    def send_mailing(mailing, from_email='Apeecks@mail.ru', fail_silently=False):
+    def send_to_recipients(mailing, recipients, pool, attempts, from_email='Apeecks@mail.ru', rate_limiter=None):
         """
-        Отправляет письма всем получателям рассылки.
-        Создаёт записи MailingIsSuccess для каждой попытки.
+        Отправляет персональное письмо рассылки переданным получателям через пул соединений.
+        Сообщение компилируется один раз и берётся из LRU-кеша template_cache,
+        MIME письма кодируется один раз (PreparedMessage), на получателя подставляются только его значения.
+        Каждая попытка добавляется в буфер attempts.
         """
         sent = 0
         failed = 0
-        msg = mailing.message
-        recipients = mailing.recipients.all()
+        prepared = PreparedMessage(template_cache.get(mailing.message), from_email)
 
         for r in recipients:
+            if rate_limiter is not None:
+                rate_limiter.wait()
             try:
-                send_mail(
-                    subject=msg.header,
-                    message=msg.body,
-                    from_email=from_email,
-                    recipient_list=[r.email],
-                    fail_silently=fail_silently,
-                )
-                MailingIsSuccess.objects.create(
-                    status='Успешно',
+                # адрес не проверяется при сохранении: письмо с неверным адресом не собирается (ValueError)
+                pool.send(prepared.build(r))
+                attempts.add(
+                    status=AttemptStatus.SUCCESS,
                     answer='OK',
-                    mailing=mailing
+                    code=SMTP_OK,
+                    mailing=mailing,
+                    recipient_id=r.id
                 )
                 sent += 1
             except Exception as exc:
-                MailingIsSuccess.objects.create(
-                    status='Не успешно',
-                    answer=str(exc),
-                    mailing=mailing
+                attempts.add(
+                    status=AttemptStatus.FAILED,
+                    answer=str(exc)[:500],
+                    code=smtp_code(exc),
+                    mailing=mailing,
+                    recipient_id=r.id
                 )
                 failed += 1
 
+        return {'sent': sent, 'failed': failed}
+
+    @staticmethod
+    def _send_worker(mailing, recipients, pool, attempts, from_email, rate_limiter):
+        """Поток отправки: берёт получателей из общего итератора, пока они не закончатся"""
+        try:
+            return MailingServices.send_to_recipients(mailing, recipients, pool, attempts, from_email, rate_limiter)
+        finally:
+            # У каждого потока своё соединение с БД
+            connection.close()
+
+    @staticmethod
+    def send_mailing(mailing, from_email='Apeecks@mail.ru', fail_silently=False, pool=None,
+                     workers=1, rate_limiter=None):
+        """
+        Отправляет письма всем получателям рассылки.
+        Незавершённый прогон продолжается с контрольной точки: получатели,
+        которым в нём уже успешно отправлено, пропускаются.
+        Записи MailingIsSuccess сохраняются пачками через AttemptBuffer.
+        Письма уходят через пул переиспользуемых соединений: переданный
+        в pool или временный, который закрывается после отправки.
+        При workers > 1 потоки разбирают общий поток получателей,
+        каждый получатель достаётся ровно одному потоку, а результаты суммируются.
+        """
+        checkpoint = MailingServices.start_run(mailing)
+        recipients = MailingServices.iter_recipients(MailingServices.pending_recipients(mailing, checkpoint))
+        workers = max(1, workers)
+        # Сообщение загружается один раз, до запуска потоков
+        mailing.message
+
+        own_pool = pool is None
+        if own_pool:
+            pool = SMTPConnectionPool(size=workers, fail_silently=fail_silently)
+
+        try:
+            with AttemptBuffer() as attempts:
+                result = MailingServices._dispatch(
+                    mailing, recipients, pool, attempts, from_email, workers, rate_limiter
+                )
+        finally:
+            if own_pool:
+                pool.close()
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at'])
         MailingServices.update_mailing_status(mailing)
 
-        return {'sent': sent, 'failed': failed}
+        return result
+
+    @staticmethod
+    async def asend_mailing(mailing, from_email='Apeecks@mail.ru', pool=None, concurrency=None, timeout=None,
+                            rate_limiter=None):
+        """
+        Асинхронная отправка рассылки для вызова из async-кода (ASGI-представления, asyncio.run).
+        Почтовые бэкенды Django синхронные, поэтому каждый SMTP-диалог идёт в отдельном потоке
+        на своём соединении пула, а event loop держит в работе до concurrency писем одновременно
+        (не больше числа соединений пула). SMTP-диалог ограничен таймаутом сокета: своего пула — timeout секунд,
+        переданный пул должен быть создан с таймаутом (timeout или EMAIL_TIMEOUT), иначе ValueError:
+        зависший сервер навсегда занял бы поток отправки. Поток не прерывается снаружи, поэтому исход
+        попытки всегда решает его результат: письмо, которое ещё может уйти, не записывается неуспешным
+        и не отправляется повторно --retry-failed.
+        Получатели идут через DomainScheduler с лимитами доменов, как в синхронной отправке;
+        общий лимит rate_limiter и токены доменов ожидаются через asyncio.sleep, не блокируя loop.
+        Попытки сохраняются пачками так же, как в AttemptBuffer.
+        """
+        concurrency = concurrency or getattr(settings, 'MAILING_ASYNC_CONCURRENCY', 20)
+        timeout = timeout or getattr(settings, 'MAILING_SEND_TIMEOUT', 30)
+        batch_size = getattr(settings, 'MAILING_ATTEMPT_BATCH_SIZE', 500)
+        if pool is not None and pool.timeout is None:
+            raise ValueError("Пул асинхронной отправки должен ограничивать SMTP-диалог таймаутом (timeout)")
+
+        prepared = PreparedMessage(template_cache.get(await Message.objects.aget(pk=mailing.message_id)), from_email)
+        checkpoint = await sync_to_async(MailingServices.start_run)(mailing)
+        # Запрос получателей строится до event loop: mailing.segment читается лениво,
+        # а синхронный запрос к БД внутри event loop запрещён (SynchronousOnlyOperation)
+        pending = await sync_to_async(MailingServices.pending_recipients)(mailing, checkpoint)
+
+        own_pool = pool is None
+        if own_pool:
+            pool = SMTPConnectionPool(size=concurrency, timeout=timeout)
+
+        loop = asyncio.get_running_loop()
+        # Ожидание свободного соединения не должно входить в timeout письма
+        semaphore = asyncio.Semaphore(min(concurrency, pool.size))
+        executor = ThreadPoolExecutor(max_workers=pool.size)
+        attempts = []
+        tasks = set()
+        result = {'sent': 0, 'failed': 0}
+
+        async def deliver(recipient):
+            try:
+                # ошибка сборки письма записывается попыткой и не должна оставить семафор занятым
+                email = prepared.build(recipient)
+                await loop.run_in_executor(executor, pool.send, email)
+                attempts.append(MailingIsSuccess(
+                    status=AttemptStatus.SUCCESS, answer='OK', code=SMTP_OK, mailing=mailing, recipient_id=recipient.id
+                ))
+                result['sent'] += 1
+            except Exception as exc:
+                answer = 'Превышено время ожидания ответа SMTP' if isinstance(exc, TimeoutError) else str(exc)
+                attempts.append(MailingIsSuccess(
+                    status=AttemptStatus.FAILED, answer=answer[:500], code=smtp_code(exc), mailing=mailing,
+                    recipient_id=recipient.id
+                ))
+                result['failed'] += 1
+            finally:
+                semaphore.release()
+
+        async def flush():
+            batch = attempts[:]
+            del attempts[:len(batch)]
+            if batch:
+                await sync_to_async(AttemptBuffer(batch_size)._save)(batch)
+
+        try:
+            scheduled = DomainScheduler(MailingServices.aiter_recipients(pending), DomainRateLimiter())
+            async for recipient in scheduled:
+                if rate_limiter is not None:
+                    await asyncio.sleep(rate_limiter.reserve())
+                await semaphore.acquire()
+                task = asyncio.create_task(deliver(recipient))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if len(attempts) >= batch_size:
+                    await flush()
+            await asyncio.gather(*tasks)
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await flush()
+            executor.shutdown()
+            if own_pool:
+                pool.close()
+
+        checkpoint.finished_at = timezone.now()
+        await checkpoint.asave(update_fields=['finished_at'])
+        await sync_to_async(MailingServices.update_mailing_status)(mailing)
+
+        return result
+
+    @staticmethod
+    def iter_recipients(recipients, chunk_size=None):
+        """
+        Потоково перебирает получателей пачками по первичному ключу (keyset-пагинация).
+        Читаются только id, email и full_name; память не зависит от размера рассылки,
+        а каждая пачка — быстрый индексный запрос WHERE id > last ORDER BY id LIMIT n.
+        """
+        chunk_size = chunk_size or getattr(settings, 'MAILING_RECIPIENT_CHUNK_SIZE', 2000)
+        return keyset_rows(recipients, RECIPIENT_FIELDS, chunk_size)
+
+    @staticmethod
+    async def aiter_recipients(recipients, chunk_size=None):
+        """Асинхронный вариант iter_recipients"""
+        chunk_size = chunk_size or getattr(settings, 'MAILING_RECIPIENT_CHUNK_SIZE', 2000)
+        rows = recipients.order_by('pk').values_list(*RECIPIENT_FIELDS, named=True)
+        last_pk = 0
+        while True:
+            chunk = [row async for row in rows.filter(pk__gt=last_pk)[:chunk_size]]
+            if not chunk:
+                return
+            for row in chunk:
+                yield row
+            last_pk = chunk[-1].id
+
+    @staticmethod
+    def start_run(mailing):
+        """Открывает новый прогон рассылки или возвращает незавершённый"""
+        now = timezone.now()
+        checkpoint, created = MailingCheckpoint.objects.get_or_create(
+            mailing=mailing,
+            defaults={'started_at': now},
+        )
+        if not created and checkpoint.finished_at is not None:
+            checkpoint.started_at = now
+            checkpoint.finished_at = None
+            checkpoint.save(update_fields=['started_at', 'finished_at'])
+        return checkpoint
+
+    @staticmethod
+    def pending_recipients(mailing, checkpoint):
+        """Получатели, которым в текущем прогоне ещё не отправлено успешно"""
+        delivered = mailing.attempts.filter(
+            status=AttemptStatus.SUCCESS,
+            date_mailing__gte=checkpoint.started_at,
+            recipient__isnull=False,
+        ).values('recipient_id')
+        return mailing.get_recipients().filter(unsubscribed=False).exclude(pk__in=delivered)
+
+    @staticmethod
+    def failed_recipients(mailing):
+        """Получатели, последняя попытка отправки которым была неуспешной"""
+        last_status = Subquery(
+            MailingIsSuccess.objects.filter(mailing=mailing, recipient=OuterRef('pk'))
+            .order_by('-date_mailing', '-id')
+            .values('status')[:1]
+        )
+        return mailing.get_recipients().filter(unsubscribed=False).annotate(
+            last_status=last_status
+        ).filter(last_status=AttemptStatus.FAILED)
+
+    @staticmethod
+    def retry_failed(mailing, from_email='Apeecks@mail.ru', pool=None, workers=1, rate_limiter=None,
+                     max_retries=3, backoff=1.0):
+        """
+        Повторно отправляет письма только получателям с неуспешной последней попыткой.
+        Между раундами пауза растёт экспоненциально: backoff, 2 * backoff, 4 * backoff...
+        В failed возвращается число получателей, которым так и не удалось отправить.
+        """
+        result = {'sent': 0, 'failed': 0}
+        mailing.message
+
+        own_pool = pool is None
+        if own_pool:
+            pool = SMTPConnectionPool(size=workers)
+
+        try:
+            for retry in range(max_retries):
+                failed = MailingServices.failed_recipients(mailing)
+                if not failed.exists():
+                    break
+                if retry:
+                    time.sleep(backoff * 2 ** (retry - 1))
+
+                with AttemptBuffer() as attempts:
+                    round_result = MailingServices._dispatch(
+                        mailing, MailingServices.iter_recipients(failed), pool, attempts, from_email,
+                        max(1, workers), rate_limiter
+                    )
+                result['sent'] += round_result['sent']
+                result['failed'] = round_result['failed']
+        finally:
+            if own_pool:
+                pool.close()
+
+        return result
+
+    @staticmethod
+    def _dispatch(mailing, recipients, pool, attempts, from_email, workers, rate_limiter):
+        """
+        Отправка в текущем потоке или параллельно по частям с суммированием результатов.
+        Получатели идут через DomainScheduler: домены чередуются, лимиты доменов общие для всех обработчиков.
+        """
+        recipients = DomainScheduler(recipients, DomainRateLimiter())
+        if workers == 1:
+            return MailingServices.send_to_recipients(
+                mailing, recipients, pool, attempts, from_email, rate_limiter
+            )
+
+        result = {'sent': 0, 'failed': 0}
+        shared = LockedIterator(recipients)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    MailingServices._send_worker,
+                    mailing, shared, pool, attempts, from_email, rate_limiter,
+                )
+                for _ in range(workers)
+            ]
+            for future in futures:
+                worker_result = future.result()
+                result['sent'] += worker_result['sent']
+                result['failed'] += worker_result['failed']
+        return result
+
+    @staticmethod
+    def enqueue_mailing(mailing):
+        """Ставит рассылку в очередь или возвращает уже ожидающее/выполняемое задание"""
+        active = mailing.jobs.filter(status__in=[JobStatus.QUEUED, JobStatus.RUNNING])
+        job = active.first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                return MailingJob.objects.create(mailing=mailing)
+        except IntegrityError:
+            # Задание успел создать параллельный запрос
+            return active.get()
+
+    @staticmethod
+    def claim_job(worker):
+        """
+        Забирает самое старое задание из очереди.
+        SELECT ... FOR UPDATE SKIP LOCKED позволяет нескольким обработчикам
+        разбирать очередь одновременно, не получая одно и то же задание.
+        """
+        with transaction.atomic():
+            job = (
+                MailingJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=JobStatus.QUEUED)
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+            now = timezone.now()
+            job.status = JobStatus.RUNNING
+            job.worker = worker
+            job.started_at = now
+            job.heartbeat_at = now
+            job.save(update_fields=['status', 'worker', 'started_at', 'heartbeat_at'])
+        return job
+
+    @staticmethod
+    def finish_job(job, result=None, error=''):
+        job.status = JobStatus.FAILED if error else JobStatus.DONE
+        job.finished_at = timezone.now()
+        job.error = error
+        if result is not None:
+            job.sent = result['sent']
+            job.failed = result['failed']
+        job.save(update_fields=['status', 'finished_at', 'error', 'sent', 'failed'])
+
+    @staticmethod
+    def requeue_job(job):
+        """Возвращает прерванное задание в очередь; отправка продолжится с контрольной точки"""
+        MailingJob.objects.filter(pk=job.pk, status=JobStatus.RUNNING).update(
+            status=JobStatus.QUEUED, worker='', heartbeat_at=None
+        )
+
+    @staticmethod
+    def requeue_stale_jobs(timeout):
+        """Возвращает в очередь задания, обработчик которых не подаёт признаков жизни timeout секунд"""
+        deadline = timezone.now() - timedelta(seconds=timeout)
+        return MailingJob.objects.filter(status=JobStatus.RUNNING, heartbeat_at__lt=deadline).update(
+            status=JobStatus.QUEUED, worker='', heartbeat_at=None
+        )
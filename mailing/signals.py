@@ -0,0 +1,64 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.cache import bump_version
+
+from .models import Mailing, MailingRecipients, MailingStatus, Message, RecipientSegment
+from .stats import StatsServices
+
+RUNNING = MailingStatus.RUNNING
+
+
+@receiver(post_save, sender=Mailing)
+def mailing_saved(sender, instance, created, **kwargs):
+    was_running = not created and getattr(instance, '_loaded_status', None) == RUNNING
+    is_running = instance.status == RUNNING
+    StatsServices.increment(
+        total_mailings=1 if created else 0,
+        active_mailings=int(is_running) - int(was_running),
+    )
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Mailing)
+def mailing_deleting(sender, instance, **kwargs):
+    # Попытки и дневные сводки удаляются каскадом без сигналов, поэтому счётчики
+    # уменьшаются до удаления, в той же транзакции
+    StatsServices.forget_attempts(StatsServices.attempt_counts(instance), instance.owner_id)
+
+
+@receiver(post_delete, sender=Mailing)
+def mailing_deleted(sender, instance, **kwargs):
+    StatsServices.increment(
+        total_mailings=-1,
+        active_mailings=-1 if instance.status == RUNNING else 0,
+    )
+
+
+@receiver(post_save, sender=MailingRecipients)
+def recipient_saved(sender, instance, created, **kwargs):
+    if created:
+        StatsServices.increment(unique_recipients=1)
+
+
+@receiver(post_delete, sender=MailingRecipients)
+def recipient_deleted(sender, instance, **kwargs):
+    StatsServices.increment(unique_recipients=-1)
+
+
+@receiver(post_save, sender=Mailing)
+@receiver(post_delete, sender=Mailing)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=MailingRecipients)
+@receiver(post_delete, sender=MailingRecipients)
+@receiver(post_save, sender=RecipientSegment)
+@receiver(post_delete, sender=RecipientSegment)
+def invalidate_view_cache(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(m2m_changed, sender=Mailing.recipients.through)
+def mailing_recipients_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version(Mailing)
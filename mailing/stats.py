@@ -0,0 +1,146 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from .models import (AttemptDailySummary, AttemptStatus, Mailing, MailingIsSuccess, MailingRecipients, MailingStatus,
+                     StatCounter, UserAttemptCounter)
+
+COUNTERS = (
+    'total_mailings',
+    'active_mailings',
+    'unique_recipients',
+    'attempts_success',
+    'attempts_failed',
+    'attempts_total',
+)
+
+
+class StatsServices:
+    @staticmethod
+    def read():
+        """Все счётчики главной страницы одним запросом"""
+        counters = dict.fromkeys(COUNTERS, 0)
+        counters.update(StatCounter.objects.values_list('name', 'value'))
+        return counters
+
+    @staticmethod
+    def increment(**deltas):
+        """Атомарно изменяет несколько счётчиков одним UPDATE"""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        StatCounter.objects.filter(name__in=deltas).update(
+            value=F('value') + Case(
+                *(When(name=name, then=Value(delta)) for name, delta in deltas.items()),
+                default=Value(0),
+            )
+        )
+
+    @staticmethod
+    def record_attempts(attempts):
+        """Учитывает сохранённую пачку попыток рассылки"""
+        success = sum(1 for attempt in attempts if attempt.status == AttemptStatus.SUCCESS)
+        StatsServices.increment(
+            attempts_success=success,
+            attempts_failed=len(attempts) - success,
+            attempts_total=len(attempts),
+        )
+        StatsServices.record_user_attempts(attempts)
+
+    @staticmethod
+    def record_user_attempts(attempts):
+        """Прибавляет попытки к счётчикам владельцев рассылок одним INSERT ... ON CONFLICT"""
+        per_mailing = Counter(attempt.mailing_id for attempt in attempts)
+        per_user = Counter()
+        for mailing_id, owner_id in Mailing.objects.filter(id__in=per_mailing).values_list('id', 'owner_id'):
+            per_user[owner_id] += per_mailing[mailing_id]
+        if not per_user:
+            return
+        # пользователи по порядку id: параллельные обработчики блокируют строки в одном порядке
+        rows = sorted(per_user.items())
+        table = UserAttemptCounter._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{table}" (user_id, value) VALUES {", ".join(["(%s, %s)"] * len(rows))} '
+                f'ON CONFLICT (user_id) DO UPDATE SET value = "{table}".value + EXCLUDED.value',
+                [value for row in rows for value in row],
+            )
+
+    @staticmethod
+    def count_attempts(attempts):
+        """Число попыток queryset журнала: всего, успешных, неуспешных, одним запросом"""
+        return attempts.aggregate(
+            attempts_success=Count('id', filter=Q(status=AttemptStatus.SUCCESS)),
+            attempts_failed=Count('id', filter=Q(status=AttemptStatus.FAILED)),
+            attempts_total=Count('id'),
+        )
+
+    @staticmethod
+    def forget_attempts(counts, owner_id):
+        """
+        Вычитает удаляемые попытки (словарь как у count_attempts) из счётчиков главной страницы
+        и счётчика владельца рассылки. Счётчик владельца только уменьшается UPDATE:
+        если пользователь удаляется вместе с рассылкой, строки счётчика уже может не быть.
+        """
+        StatsServices.increment(**{name: -value for name, value in counts.items()})
+        if counts['attempts_total']:
+            UserAttemptCounter.objects.filter(user_id=owner_id).update(value=F('value') - counts['attempts_total'])
+
+    @staticmethod
+    def attempt_counts(mailing=None):
+        """
+        Число попыток (всего, успешных, неуспешных) по журналу и дневной сводке.
+        Секции журнала старше срока хранения свёрнуты в AttemptDailySummary и удалены,
+        поэтому попытка учитывается ровно в одной из таблиц.
+        """
+        attempts = MailingIsSuccess.objects.all()
+        summaries = AttemptDailySummary.objects.all()
+        if mailing is not None:
+            attempts = attempts.filter(mailing=mailing)
+            summaries = summaries.filter(mailing=mailing)
+
+        raw = StatsServices.count_attempts(attempts)
+        rolled_up = summaries.aggregate(
+            attempts_success=Sum('count', filter=Q(status=AttemptStatus.SUCCESS), default=0),
+            attempts_failed=Sum('count', filter=Q(status=AttemptStatus.FAILED), default=0),
+            attempts_total=Sum('count', default=0),
+        )
+        return {name: raw[name] + rolled_up[name] for name in raw}
+
+    @staticmethod
+    def calculate():
+        """Точные значения счётчиков по исходным таблицам"""
+        return {
+            'total_mailings': Mailing.objects.count(),
+            'active_mailings': Mailing.objects.filter(status=MailingStatus.RUNNING).count(),
+            'unique_recipients': MailingRecipients.objects.count(),
+            **StatsServices.attempt_counts(),
+        }
+
+    @staticmethod
+    def calculate_user_attempts():
+        """Точное число попыток по владельцам рассылок: журнал плюс дневная сводка"""
+        totals = Counter()
+        raw = MailingIsSuccess.objects.values_list('mailing__owner').annotate(total=Count('id')).order_by()
+        rolled_up = AttemptDailySummary.objects.values_list('mailing__owner').annotate(total=Sum('count')).order_by()
+        for owner_id, total in [*raw, *rolled_up]:
+            totals[owner_id] += total
+        return totals
+
+    @staticmethod
+    def reconcile():
+        """Пересчитывает счётчики заново, устраняя накопившееся расхождение"""
+        values = StatsServices.calculate()
+        for name, value in values.items():
+            StatCounter.objects.update_or_create(name=name, defaults={'value': value})
+
+        totals = StatsServices.calculate_user_attempts()
+        with transaction.atomic():
+            UserAttemptCounter.objects.all().delete()
+            UserAttemptCounter.objects.bulk_create(
+                [UserAttemptCounter(user_id=user_id, value=value) for user_id, value in totals.items()],
+                batch_size=1000,
+            )
+        values['user_attempt_counters'] = len(totals)
+        return values
@@ -0,0 +1,827 @@
+import asyncio
+import smtplib
+import threading
+from datetime import timedelta
+from io import BytesIO
+from email import message_from_bytes, policy
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.pagination import KeysetPaginator
+
+from .delivery import DomainRateLimiter, SMTPConnectionPool
+from .importers import RecipientImporter
+from .models import (AttemptDailySummary, AttemptStatus, JobStatus, Mailing, MailingIsSuccess, MailingJob,
+                     MailingRecipients, MailingStatus, Message, RecipientSegment, UserAttemptCounter)
+from .partitions import DEFAULT_PARTITION, AttemptPartitions, month_start, partition_name
+from .rendering import CompiledMessage, PreparedMessage, build_email
+from .services import AttemptBuffer, DomainScheduler, MailingServices
+from .stats import StatsServices
+
+User = get_user_model()
+
+# Версии кеша страниц и права пользователей хранятся в кеше: тестам не нужен Redis
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(email='owner@example.com', **fields):
+    return User.objects.create_user(email=email, username=email, password='password', **fields)
+
+
+class MailingFixtureMixin:
+    @classmethod
+    def create_recipients(cls, count, start=0):
+        return MailingRecipients.objects.bulk_create(
+            MailingRecipients(
+                email=f'r{number}@d{number % 3}.example.com', full_name=f'Получатель {number}',
+                comment='', owner=cls.owner,
+            )
+            for number in range(start, start + count)
+        )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.message = Message.objects.create(header='Тема', body='Текст', owner=cls.owner)
+        now = timezone.now()
+        cls.mailing = Mailing.objects.create(
+            start=now - timedelta(hours=1),
+            end=now + timedelta(hours=1),
+            status=MailingStatus.RUNNING,
+            message=cls.message,
+            owner=cls.owner,
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HotQueryPlanTests(MailingFixtureMixin, TestCase):
+    """Горячие запросы по статусам обслуживаются своими индексами"""
+
+    def assertUsesIndex(self, queryset, index=None):
+        # на пустых таблицах планировщик выбирает полный просмотр, поэтому он запрещается:
+        # если индекс к запросу неприменим, в плане всё равно останется Seq Scan
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        if index is not None:
+            self.assertIn(index, plan)
+
+    def test_active_mailings_use_partial_window_index(self):
+        self.assertUsesIndex(MailingServices.active_mailings(), 'mailing_active_window_idx')
+
+    def test_running_filter_uses_partial_window_index(self):
+        queryset = MailingServices.filter_by_status(Mailing.objects.all(), MailingStatus.RUNNING)
+        self.assertUsesIndex(queryset, 'mailing_active_window_idx')
+
+    def test_owner_status_filter_uses_index(self):
+        queryset = Mailing.objects.filter(owner=self.owner, status=MailingStatus.DISABLED)
+        self.assertUsesIndex(queryset, 'mailing_owner_status_idx')
+
+    def test_failed_attempts_use_index(self):
+        # (mailing, status) и другие индексы, начинающиеся с mailing_id, на пустой таблице равноценны,
+        # поэтому проверяется только отсутствие полного просмотра секций
+        queryset = MailingIsSuccess.objects.filter(mailing=self.mailing, status=AttemptStatus.FAILED).order_by()
+        self.assertUsesIndex(queryset)
+
+    def test_active_mailings_skip_disabled_and_finished(self):
+        Mailing.objects.filter(pk=self.mailing.pk).update(status=MailingStatus.DISABLED)
+        self.assertFalse(MailingServices.active_mailings().exists())
+        Mailing.objects.filter(pk=self.mailing.pk).update(status=MailingStatus.CREATED)
+        self.assertTrue(MailingServices.active_mailings().exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PreparedMessageTests(TestCase):
+    """Письмо из подготовленного MIME совпадает с собранным целиком"""
+
+    recipient = SimpleNamespace(id=5, email='ivan@example.com', full_name='Иван Петров')
+
+    def parse(self, email):
+        return message_from_bytes(email.message().as_bytes(linesep='\r\n'), policy=policy.default)
+
+    def leaves(self, message):
+        return [
+            (part.get_content_type(), part['Content-Transfer-Encoding'], part.get_content())
+            for part in message.walk() if not part.is_multipart()
+        ]
+
+    def test_ascii_template_with_non_ascii_values_is_8bit(self):
+        compiled = CompiledMessage(SimpleNamespace(
+            header='Hello {{ full_name }}',
+            body='Dear {{ full_name }}, unsubscribe: {{ unsubscribe_url }}',
+            html_body='<p>Hi {{ full_name }}</p>',
+        ))
+        prepared = PreparedMessage(compiled, 'from@example.com')
+        self.assertIsNotNone(prepared.parts)
+
+        got = self.parse(prepared.build(self.recipient))
+        expected = self.parse(build_email(compiled, self.recipient, 'from@example.com'))
+        self.assertEqual(got['Subject'], expected['Subject'])
+        self.assertEqual(got['To'], expected['To'])
+        self.assertEqual(self.leaves(got), self.leaves(expected))
+        self.assertEqual({encoding for _, encoding, _ in self.leaves(got)}, {'8bit'})
+
+    def test_quoted_printable_body_falls_back_to_full_build(self):
+        compiled = CompiledMessage(SimpleNamespace(header='x', body='a' * 1200 + ' {{ full_name }}', html_body=''))
+        prepared = PreparedMessage(compiled, 'from@example.com')
+        self.assertIsNone(prepared.parts)
+        self.assertIn('Иван Петров', self.parse(prepared.build(self.recipient)).get_content())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryCountTests(MailingFixtureMixin, TestCase):
+    """Число запросов страниц и отправки не растёт с числом строк"""
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def add_rows(self, count):
+        recipients = self.create_recipients(count, start=MailingRecipients.objects.count())
+        self.mailing.recipients.add(*recipients)
+        for number in range(count):
+            message = Message.objects.create(header=f'Тема {number}', body='Текст', owner=self.owner)
+            mailing = Mailing.objects.create(
+                start=self.mailing.start, end=self.mailing.end, message=message, owner=self.owner
+            )
+            RecipientSegment.objects.create(name=f'Сегмент {number}', rules={'email_domain': 'd1.example.com'},
+                                            owner=self.owner)
+            MailingIsSuccess.objects.create(mailing=mailing, status=AttemptStatus.SUCCESS, answer='OK',
+                                            recipient=recipients[number])
+
+    def assertConstantQueries(self, url):
+        self.add_rows(1)
+        # первый запрос заполняет сессию и версии кеша страниц
+        self.client.get(url)
+        # считаются запросы построения страницы, а не ответа из кеша
+        cache.clear()
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(10)
+        cache.clear()
+        with self.assertNumQueries(len(baseline)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_mailing_list(self):
+        self.assertConstantQueries(reverse('mailing:mailing_list'))
+
+    def test_mailing_detail(self):
+        self.assertConstantQueries(reverse('mailing:mailing_detail', args=[self.mailing.pk]))
+
+    def test_mailing_recipients_page(self):
+        self.assertConstantQueries(reverse('mailing:mailing_recipients', args=[self.mailing.pk]))
+
+    def test_recipient_list(self):
+        self.assertConstantQueries(reverse('mailing:recipient_list'))
+
+    def test_recipient_detail(self):
+        recipient = self.create_recipients(1, start=1000)[0]
+        self.assertConstantQueries(reverse('mailing:recipients_detail', args=[recipient.pk]))
+
+    def test_message_list(self):
+        self.assertConstantQueries(reverse('mailing:message_list'))
+
+    def test_message_detail(self):
+        self.assertConstantQueries(reverse('mailing:message_detail', args=[self.message.pk]))
+
+    def test_segment_list(self):
+        self.assertConstantQueries(reverse('mailing:segment_list'))
+
+    def test_attempt_list(self):
+        self.assertConstantQueries(reverse('mailing:attempt_list'))
+
+    def test_send_mailing(self):
+        self.mailing.recipients.add(*self.create_recipients(5))
+        # первый прогон создаёт контрольную точку и счётчик попыток владельца
+        MailingServices.send_mailing(self.mailing)
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(MailingServices.send_mailing(self.mailing), {'sent': 5, 'failed': 0})
+
+        self.mailing.recipients.add(*self.create_recipients(50, start=5))
+        # попытки пишутся одной пачкой, получатели читаются страницами по ключу
+        with self.assertNumQueries(len(baseline)):
+            self.assertEqual(MailingServices.send_mailing(self.mailing), {'sent': 55, 'failed': 0})
+
+
+class FakeSMTPBackend(BaseEmailBackend):
+    """Почтовый бэкенд в памяти; disconnects следующих отправок обрываются как закрытая сервером сессия"""
+
+    instances = []
+    disconnects = 0
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = []
+        self.closed = False
+        self.instances.append(self)
+
+    def open(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def send_messages(self, email_messages):
+        if FakeSMTPBackend.disconnects:
+            FakeSMTPBackend.disconnects -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.extend(email_messages)
+        return len(email_messages)
+
+
+class SMTPConnectionPoolTests(TestCase):
+    def setUp(self):
+        FakeSMTPBackend.instances = []
+        FakeSMTPBackend.disconnects = 0
+
+    def pool(self, **kwargs):
+        return SMTPConnectionPool(backend='mailing.tests.FakeSMTPBackend', **kwargs)
+
+    def email(self):
+        return build_email(
+            CompiledMessage(SimpleNamespace(header='Тема', body='Текст', html_body='')),
+            SimpleNamespace(id=1, email='ivan@example.com', full_name='Иван'),
+            'from@example.com',
+        )
+
+    def test_connection_is_reused_and_recycled_after_max_messages(self):
+        with self.pool(size=1, max_messages=2) as pool:
+            for _ in range(5):
+                pool.send(self.email())
+
+        self.assertEqual([len(backend.sent) for backend in FakeSMTPBackend.instances], [2, 2, 1])
+        self.assertTrue(all(backend.closed for backend in FakeSMTPBackend.instances))
+
+    def test_disconnected_session_is_reopened_once(self):
+        FakeSMTPBackend.disconnects = 1
+        with self.pool(size=1) as pool:
+            self.assertEqual(pool.send(self.email()), 1)
+            pool.send(self.email())
+
+        first, second = FakeSMTPBackend.instances
+        self.assertTrue(first.closed)
+        self.assertEqual(len(second.sent), 2)
+
+    def test_repeated_disconnect_is_raised_and_connection_discarded(self):
+        FakeSMTPBackend.disconnects = 2
+        with self.pool(size=1) as pool:
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                pool.send(self.email())
+            # оборванное соединение не возвращается в пул
+            pool.send(self.email())
+
+        self.assertEqual([len(backend.sent) for backend in FakeSMTPBackend.instances], [0, 0, 1])
+        self.assertTrue(FakeSMTPBackend.instances[1].closed)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AttemptBufferTests(MailingFixtureMixin, TestCase):
+    def test_attempts_are_saved_in_batches_and_rest_on_exit(self):
+        recipients = self.create_recipients(5)
+        with AttemptBuffer(batch_size=2) as attempts:
+            for recipient in recipients:
+                attempts.add(status=AttemptStatus.SUCCESS, answer='OK', mailing=self.mailing,
+                             recipient_id=recipient.id)
+            self.assertEqual(self.mailing.attempts.count(), 4)
+        self.assertEqual(self.mailing.attempts.count(), 5)
+
+
+class RecordingPool:
+    """Пул-заглушка: запоминает адресатов, после limit писем прерывает отправку, как остановка процесса"""
+
+    size = 1
+    timeout = 30
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.sent = []
+
+    def send(self, email_message):
+        if self.limit is not None and len(self.sent) >= self.limit:
+            raise KeyboardInterrupt
+        self.sent.extend(email_message.to)
+        return 1
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CheckpointResumeTests(MailingFixtureMixin, TestCase):
+    def setUp(self):
+        self.recipients = self.create_recipients(10)
+        self.mailing.recipients.add(*self.recipients)
+
+    def test_interrupted_run_resumes_with_pending_recipients(self):
+        interrupted = RecordingPool(limit=3)
+        with self.assertRaises(KeyboardInterrupt):
+            MailingServices.send_mailing(self.mailing, pool=interrupted)
+        # попытки, отправленные до остановки, сохранены буфером при выходе
+        self.assertEqual(self.mailing.attempts.filter(status=AttemptStatus.SUCCESS).count(), 3)
+        self.assertIsNone(self.mailing.checkpoint.finished_at)
+
+        resumed = RecordingPool()
+        self.assertEqual(MailingServices.send_mailing(self.mailing, pool=resumed), {'sent': 7, 'failed': 0})
+        self.assertEqual(sorted(interrupted.sent + resumed.sent), sorted(r.email for r in self.recipients))
+
+        # завершённый прогон не продолжается: следующий отправляет всем заново
+        self.assertEqual(MailingServices.send_mailing(self.mailing, pool=RecordingPool()), {'sent': 10, 'failed': 0})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageCacheTests(TestCase):
+    """Страницы кешируются отдельно для каждого пользователя и его прав"""
+
+    def setUp(self):
+        cache.clear()
+        self.first = create_user('first@example.com')
+        self.second = create_user('second@example.com')
+        Message.objects.create(header='Письмо первого', body='Текст', owner=self.first)
+        Message.objects.create(header='Письмо второго', body='Текст', owner=self.second)
+        # страница кешируется только при наличии CSRF-cookie
+        self.client.cookies['csrftoken'] = 'a' * 32
+
+    def get_list(self, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(reverse('mailing:message_list')).content.decode()
+
+    def test_users_do_not_share_cached_pages(self):
+        self.assertIn('Письмо первого', self.get_list(self.first))
+        page = self.get_list(self.second)
+        self.assertIn('Письмо второго', page)
+        self.assertNotIn('Письмо первого', page)
+
+    def test_cached_page_is_invalidated(self):
+        self.get_list(self.first)
+        with self.assertNumQueries(2):
+            # сессия и пользователь, страница из кеша
+            self.get_list()
+
+        Message.objects.create(header='Новое письмо', body='Текст', owner=self.first)
+        self.assertIn('Новое письмо', self.get_list())
+
+        self.first.user_permissions.add(Permission.objects.get(codename='can_manage_messages'))
+        self.assertIn('Письмо второго', self.get_list())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class KeysetPaginatorTests(MailingFixtureMixin, TestCase):
+    def setUp(self):
+        recipients = self.create_recipients(7)
+        now = timezone.now()
+        attempts = MailingIsSuccess.objects.bulk_create(
+            MailingIsSuccess(mailing=self.mailing, recipient=recipient, status=AttemptStatus.SUCCESS, answer='OK')
+            for recipient in recipients
+        )
+        # у попыток по три одинаковых времени, порядок внутри них задаёт id;
+        # date_mailing проставляется при создании (auto_now_add), поэтому время задаётся обновлением
+        for number, attempt in enumerate(attempts):
+            MailingIsSuccess.objects.filter(pk=attempt.pk).update(date_mailing=now - timedelta(minutes=number // 3))
+        self.paginator = KeysetPaginator(
+            MailingIsSuccess.objects.filter(mailing=self.mailing), ('date_mailing', 'id'), per_page=3
+        )
+
+    def key(self, attempt):
+        return attempt.date_mailing, attempt.id
+
+    def test_pages_cover_all_rows_once_in_order(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+        rows = [self.key(attempt) for page in pages for attempt in page]
+        self.assertEqual(rows, sorted(rows, reverse=True))
+        self.assertEqual(len(set(rows)), 7)
+
+        previous = self.paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual([a.pk for a in previous], [a.pk for a in pages[1]])
+        self.assertTrue(previous.has_previous())
+        first = self.paginator.page(before=previous.previous_cursor)
+        self.assertEqual([a.pk for a in first], [a.pk for a in pages[0]])
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_is_404(self):
+        for cursor in ('garbage', self.paginator.encode(['not a date', 1]), self.paginator.encode([1])):
+            with self.assertRaises(Http404):
+                self.paginator.page(after=cursor)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MalformedAddressTests(MailingFixtureMixin, TestCase):
+    """Письмо с неверным адресом записывается неуспешной попыткой и не останавливает рассылку"""
+
+    def setUp(self):
+        self.recipients = self.create_recipients(3)
+        MailingRecipients.objects.filter(pk=self.recipients[1].pk).update(email='x@')
+        self.mailing.recipients.add(*self.recipients)
+
+    def assertBadAddressRecorded(self, result):
+        self.assertEqual(result, {'sent': 2, 'failed': 1})
+        failed = self.mailing.attempts.get(status=AttemptStatus.FAILED)
+        self.assertEqual(failed.recipient_id, self.recipients[1].pk)
+        self.assertTrue(failed.answer)
+        self.mailing.checkpoint.refresh_from_db()
+        self.assertIsNotNone(self.mailing.checkpoint.finished_at)
+
+    def test_send_mailing(self):
+        pool = RecordingPool()
+        self.assertBadAddressRecorded(MailingServices.send_mailing(self.mailing, pool=pool))
+        self.assertEqual(len(pool.sent), 2)
+
+    def test_asend_mailing(self):
+        pool = RecordingPool()
+
+        async def send():
+            # до исправления занятый семафор подвешивал отправку навсегда
+            return await asyncio.wait_for(
+                MailingServices.asend_mailing(self.mailing, pool=pool, concurrency=1), 10
+            )
+
+        self.assertBadAddressRecorded(async_to_sync(send)())
+        self.assertEqual(len(pool.sent), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AttemptPartitionTests(MailingFixtureMixin, TestCase):
+    def rows_in(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            return cursor.fetchone()[0]
+
+    def test_rows_in_default_partition_move_to_created_month(self):
+        # секция месяца не создана вовремя: попытка попадает в DEFAULT
+        month = month_start(timezone.now(), 3)
+        attempt = MailingIsSuccess.objects.create(mailing=self.mailing, status=AttemptStatus.SUCCESS, answer='OK')
+        # date_mailing проставляется при создании (auto_now_add), дата в будущем задаётся обновлением
+        MailingIsSuccess.objects.filter(pk=attempt.pk).update(date_mailing=month + timedelta(days=5))
+        self.assertEqual(self.rows_in(DEFAULT_PARTITION), 1)
+
+        self.assertIn(partition_name(month), AttemptPartitions.ensure(ahead=0))
+        self.assertEqual(self.rows_in(DEFAULT_PARTITION), 0)
+        self.assertEqual(self.rows_in(partition_name(month)), 1)
+
+        # после переноса секция сворачивается и удаляется по сроку хранения, как остальные
+        expired = AttemptPartitions.expired(now=month_start(month, 1), retention_days=0)
+        self.assertIn(partition_name(month), [name for name, _, _ in expired])
+        self.assertEqual(AttemptPartitions.drop(partition_name(month)), 1)
+        summary = AttemptDailySummary.objects.get(mailing=self.mailing)
+        self.assertEqual((summary.day, summary.count), ((month + timedelta(days=5)).date(), 1))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class JobQueueTests(MailingFixtureMixin, TestCase):
+    def test_mailing_is_queued_once(self):
+        job = MailingServices.enqueue_mailing(self.mailing)
+        self.assertEqual(MailingServices.enqueue_mailing(self.mailing), job)
+        # второе активное задание запрещено частичным уникальным ограничением
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MailingJob.objects.create(mailing=self.mailing)
+
+        MailingServices.finish_job(MailingServices.claim_job('worker'), {'sent': 1, 'failed': 0})
+        self.assertNotEqual(MailingServices.enqueue_mailing(self.mailing), job)
+
+    def test_claim_takes_oldest_queued_job(self):
+        first = MailingServices.enqueue_mailing(self.mailing)
+        other = Mailing.objects.create(start=self.mailing.start, end=self.mailing.end, message=self.message,
+                                       owner=self.owner)
+        second = MailingServices.enqueue_mailing(other)
+
+        claimed = MailingServices.claim_job('worker-1')
+        self.assertEqual(claimed, first)
+        self.assertEqual((claimed.status, claimed.worker), (JobStatus.RUNNING, 'worker-1'))
+        self.assertEqual(MailingServices.claim_job('worker-2'), second)
+        self.assertIsNone(MailingServices.claim_job('worker-3'))
+
+    def test_stale_running_job_is_requeued(self):
+        MailingServices.enqueue_mailing(self.mailing)
+        job = MailingServices.claim_job('worker')
+        self.assertEqual(MailingServices.requeue_stale_jobs(timeout=60), 0)
+
+        MailingJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(MailingServices.requeue_stale_jobs(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.heartbeat_at), (JobStatus.QUEUED, '', None))
+        self.assertEqual(MailingServices.claim_job('other'), job)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class JobQueueConcurrencyTests(TransactionTestCase):
+    """Блокировки строк видны только между соединениями, поэтому задания фиксируются в базе"""
+
+    def setUp(self):
+        owner = create_user()
+        message = Message.objects.create(header='Тема', body='Текст', owner=owner)
+        now = timezone.now()
+        self.jobs = [
+            MailingServices.enqueue_mailing(Mailing.objects.create(
+                start=now, end=now + timedelta(hours=1), message=message, owner=owner
+            ))
+            for _ in range(2)
+        ]
+
+    def claim_in_thread(self, worker):
+        claimed = []
+
+        def claim():
+            try:
+                claimed.append(MailingServices.claim_job(worker))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=claim)
+        thread.start()
+        thread.join(timeout=10)
+        return claimed[0]
+
+    def test_locked_job_is_skipped_by_other_worker(self):
+        with transaction.atomic():
+            # первое задание забирает обработчик, транзакция которого ещё открыта
+            locked = MailingJob.objects.select_for_update().get(pk=self.jobs[0].pk)
+            self.assertEqual(self.claim_in_thread('worker-2'), self.jobs[1])
+            self.assertIsNone(self.claim_in_thread('worker-3'))
+        locked.refresh_from_db()
+        self.assertEqual(locked.status, JobStatus.QUEUED)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StatCounterTests(TestCase):
+    """Счётчики главной страницы и владельцев совпадают с COUNT(*) после каждого изменения"""
+
+    def setUp(self):
+        # строки счётчиков создаёт миграция; reconcile восстанавливает их, если база тестов очищалась
+        StatsServices.reconcile()
+        self.owner = create_user()
+        self.message = Message.objects.create(header='Тема', body='Текст', owner=self.owner)
+
+    def assertCountersExact(self):
+        counters = StatsServices.read()
+        user_counters = {
+            user_id: value for user_id, value in UserAttemptCounter.objects.values_list('user_id', 'value') if value
+        }
+        exact = StatsServices.reconcile()
+        del exact['user_attempt_counters']
+        self.assertEqual(counters, exact)
+        self.assertEqual(user_counters, dict(StatsServices.calculate_user_attempts()))
+
+    def create_mailing(self, owner=None, recipients=3, success=2, failed=1):
+        now = timezone.now()
+        mailing = Mailing.objects.create(start=now - timedelta(hours=1), end=now + timedelta(hours=1),
+                                         status=MailingStatus.RUNNING, message=self.message,
+                                         owner=owner or self.owner)
+        for number in range(recipients):
+            mailing.recipients.add(MailingRecipients.objects.create(
+                email=f'r{mailing.pk}-{number}@example.com', full_name='Получатель', comment='',
+                owner=owner or self.owner,
+            ))
+        with AttemptBuffer(batch_size=2) as attempts:
+            for status in [AttemptStatus.SUCCESS] * success + [AttemptStatus.FAILED] * failed:
+                attempts.add(status=status, answer='OK', mailing=mailing)
+        return mailing
+
+    def test_counters_follow_changes(self):
+        mailing = self.create_mailing()
+        self.assertCountersExact()
+
+        mailing = Mailing.objects.get(pk=mailing.pk)
+        mailing.status = MailingStatus.DISABLED
+        mailing.save()
+        self.assertCountersExact()
+
+        MailingRecipients.objects.filter(owner=self.owner).first().delete()
+        self.assertCountersExact()
+
+    def test_cascade_delete_of_mailing_forgets_its_attempts(self):
+        kept = self.create_mailing()
+        self.create_mailing(success=5, failed=4).delete()
+        self.assertCountersExact()
+        self.assertEqual(StatsServices.read()['attempts_total'], kept.attempts.count())
+
+    def test_cascade_delete_of_owner(self):
+        other = create_user('other@example.com')
+        self.create_mailing()
+        self.create_mailing(owner=other, success=3, failed=3)
+        other.delete()
+        self.assertCountersExact()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipientImporterTests(TestCase):
+    def setUp(self):
+        StatsServices.reconcile()
+        self.owner = create_user()
+        MailingRecipients.objects.create(email='Old@Example.com', full_name='Старый', comment='', owner=self.owner)
+
+    def import_csv(self, text, encoding='utf-8', **kwargs):
+        data = text if isinstance(text, bytes) else text.encode(encoding)
+        return RecipientImporter(self.owner, **kwargs).import_file(BytesIO(data), 'recipients.csv')
+
+    def assertRecipientCounter(self):
+        self.assertEqual(StatsServices.read()['unique_recipients'], MailingRecipients.objects.count())
+
+    def test_cp1251_file_with_duplicates_and_errors(self):
+        result = self.import_csv(
+            'email,full_name\n'
+            + 'ivan@example.com,Иван\n'
+            + 'IVAN@example.com,Иван дубль\n'
+            + 'old@example.com,Старый дубль\n'
+            + 'broken,Без адреса\n'
+            + 'petr@example.com,Пётр\n',
+            encoding='cp1251', batch_size=2,
+        )
+        self.assertEqual((result['created'], result['duplicates'], result['failed']), (2, 2, 1))
+        self.assertEqual(result['errors'][0][:2], (5, 'broken'))
+        self.assertEqual(MailingRecipients.objects.get(email='petr@example.com').full_name, 'Пётр')
+        self.assertRecipientCounter()
+
+    def test_concurrently_inserted_address_is_not_counted(self):
+        # адрес добавлен параллельно после проверки существующих: вставка его пропускает
+        MailingRecipients.objects.create(email='same@example.com', full_name='Тот же', comment='', owner=self.owner)
+        with mock.patch.object(RecipientImporter, 'existing', return_value=set()):
+            result = self.import_csv('same@example.com,Тот же\nnew@example.com,Новый\n')
+        self.assertEqual((result['created'], result['duplicates']), (1, 1))
+        self.assertRecipientCounter()
+
+    def test_damaged_file_keeps_saved_batches(self):
+        data = 'a@example.com,А\nb@example.com,Б\n'.encode() + b'c@example.com,\x98\n'
+        with self.assertRaisesMessage(ValidationError, 'добавлено: 2'):
+            self.import_csv(data, batch_size=2)
+        self.assertTrue(MailingRecipients.objects.filter(email='b@example.com').exists())
+        self.assertRecipientCounter()
+
+    def test_invalid_files_are_validation_errors(self):
+        with self.assertRaises(ValidationError):
+            self.import_csv(b'\x98\n')
+        with self.assertRaises(ValidationError):
+            RecipientImporter(self.owner).import_file(BytesIO(b'not a zip'), 'recipients.xlsx')
+        with self.assertRaises(ValidationError):
+            RecipientImporter(self.owner).import_file(BytesIO(b''), 'recipients.txt')
+
+
+class RecordingLimiter:
+    """Лимитер доменов, который запоминает потоки своих вызовов и всегда даёт токен"""
+
+    enabled = True
+
+    def __init__(self):
+        self.threads = set()
+
+    def acquire(self, domain):
+        self.threads.add(threading.get_ident())
+        return 0
+
+
+@override_settings(CACHES=LOCMEM_CACHES, EMAIL_TIMEOUT=None)
+class AsyncDeliveryTests(MailingFixtureMixin, TestCase):
+    def test_pool_without_timeout_is_rejected(self):
+        self.mailing.recipients.add(*self.create_recipients(2))
+        pool = SMTPConnectionPool(size=2, backend='mailing.tests.FakeSMTPBackend')
+        with self.assertRaises(ValueError):
+            async_to_sync(MailingServices.asend_mailing)(self.mailing, pool=pool)
+
+        FakeSMTPBackend.instances = []
+        with SMTPConnectionPool(size=2, backend='mailing.tests.FakeSMTPBackend', timeout=5) as pool:
+            result = async_to_sync(MailingServices.asend_mailing)(self.mailing, pool=pool)
+        self.assertEqual(result, {'sent': 2, 'failed': 0})
+
+    def test_domain_limiter_is_called_outside_event_loop(self):
+        limiter = RecordingLimiter()
+
+        async def recipients():
+            for number in range(4):
+                yield SimpleNamespace(email=f'r{number}@d{number % 2}.example.com')
+
+        async def schedule():
+            return threading.get_ident(), [r.email async for r in DomainScheduler(recipients(), limiter)]
+
+        loop_thread, emails = async_to_sync(schedule)()
+        self.assertEqual(len(emails), 4)
+        self.assertTrue(limiter.threads)
+        self.assertNotIn(loop_thread, limiter.threads)
+
+
+class FakeClock:
+    """Часы для time.monotonic/time.sleep: sleep сдвигает время мгновенно и запоминает паузы"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DomainSchedulingTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for module in ('mailing.delivery.time', 'mailing.services.time'):
+            patcher = mock.patch(module, self.clock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def recipients(self, *emails):
+        return [SimpleNamespace(email=email) for email in emails]
+
+    def schedule(self, recipients, limiter=None, window=None):
+        return [r.email for r in DomainScheduler(recipients, limiter, window=window)]
+
+    def test_domains_are_interleaved(self):
+        emails = self.schedule(self.recipients(
+            'a1@mail.ru', 'a2@mail.ru', 'a3@mail.ru', 'b1@gmail.com', 'c1@ya.ru', 'b2@GMAIL.com',
+        ))
+        self.assertEqual(emails, ['a1@mail.ru', 'b1@gmail.com', 'c1@ya.ru', 'a2@mail.ru', 'b2@GMAIL.com',
+                                  'a3@mail.ru'])
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_window_limits_lookahead(self):
+        emails = self.schedule(self.recipients('a1@mail.ru', 'a2@mail.ru', 'a3@mail.ru', 'b1@gmail.com'), window=2)
+        self.assertEqual(emails, ['a1@mail.ru', 'a2@mail.ru', 'a3@mail.ru', 'b1@gmail.com'])
+
+    def test_local_token_bucket(self):
+        limiter = DomainRateLimiter(rates={'mail.ru': 2})
+        self.assertTrue(limiter.enabled)
+        # запас бакета — секунда отправки: два письма сразу, третье через полсекунды
+        self.assertEqual([limiter.acquire('mail.ru') for _ in range(3)], [0, 0, 0.5])
+        self.clock.now += 0.25
+        self.assertEqual(limiter.acquire('mail.ru'), 0.25)
+        self.clock.now += 0.25
+        self.assertEqual(limiter.acquire('mail.ru'), 0)
+        # домены без лимита не ограничиваются
+        self.assertEqual(limiter.acquire('gmail.com'), 0)
+        self.assertFalse(DomainRateLimiter(rates={}).enabled)
+
+    def test_limited_domain_is_skipped_until_its_token(self):
+        limiter = DomainRateLimiter(rates={'mail.ru': 1})
+        emails = self.schedule(
+            self.recipients('a1@mail.ru', 'a2@mail.ru', 'b1@gmail.com', 'b2@gmail.com'), limiter
+        )
+        # пока mail.ru ждёт токен, уходят письма gmail.com; потом поток спит до токена
+        self.assertEqual(emails, ['a1@mail.ru', 'b1@gmail.com', 'b2@gmail.com', 'a2@mail.ru'])
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StatusTransitionTests(MailingFixtureMixin, TestCase):
+    """Статус, вычисляемый в БД, совпадает с расчётом calculate_status на границах окна"""
+
+    def setUp(self):
+        StatsServices.reconcile()
+        self.now = timezone.now().replace(microsecond=500000)
+        tick = timedelta(microseconds=1)
+        hour = timedelta(hours=1)
+        windows = {
+            'до начала': (self.now + tick, self.now + hour, MailingStatus.RUNNING),
+            'в момент начала': (self.now, self.now + hour, MailingStatus.CREATED),
+            'в момент конца': (self.now - hour, self.now, MailingStatus.CREATED),
+            'после конца': (self.now - hour, self.now - tick, MailingStatus.RUNNING),
+            'отключена в окне': (self.now - hour, self.now + hour, MailingStatus.DISABLED),
+            'отключена после конца': (self.now - hour, self.now - tick, MailingStatus.DISABLED),
+        }
+        # сохранённые статусы намеренно устарели
+        self.mailings = {
+            name: Mailing.objects.create(start=start, end=end, status=status, message=self.message, owner=self.owner)
+            for name, (start, end, status) in windows.items()
+        }
+
+    def expected(self, mailing):
+        with mock.patch('mailing.services.timezone.now', return_value=self.now):
+            if mailing.status == MailingStatus.DISABLED:
+                return MailingStatus.DISABLED
+            return MailingServices.calculate_status(mailing)
+
+    def test_sql_status_matches_python_calculation(self):
+        annotated = dict(
+            MailingServices.with_current_status(Mailing.objects.all(), self.now).values_list('pk', 'current_status')
+        )
+        for name, mailing in self.mailings.items():
+            expected = self.expected(mailing)
+            with self.subTest(name):
+                self.assertEqual(annotated[mailing.pk], expected)
+                for status in MailingStatus:
+                    found = MailingServices.filter_by_status(Mailing.objects.all(), status, self.now)
+                    self.assertEqual(found.filter(pk=mailing.pk).exists(), status == expected, status.label)
+
+    def test_transition_statuses_stores_current_status(self):
+        expected = {mailing.pk: self.expected(mailing) for mailing in self.mailings.values()}
+        self.assertEqual(MailingServices.transition_statuses(self.now), 4)
+        self.assertEqual(dict(Mailing.objects.filter(pk__in=expected).values_list('pk', 'status')), expected)
+        self.assertEqual(MailingServices.transition_statuses(self.now), 0)
+        self.assertEqual(StatsServices.read()['active_mailings'],
+                         Mailing.objects.filter(status=MailingStatus.RUNNING).count())
@@ -8,12 +8,22 @@ urlpatterns = [
     path('mailing/', views.IndexView.as_view(), name='index'),
 
     path("attempts/", views.AttemptListView.as_view(), name="attempt_list"),
+    path("attempts/export/", views.AttemptExportView.as_view(), name="attempt_export"),
 
     path('recipients/', views.RecipientListView.as_view(), name='recipient_list'),
     path('recipients/add/', views.RecipientCreateView.as_view(), name='recipients_create'),
+    path('recipients/search/', views.RecipientSearchView.as_view(), name='recipient_search'),
+    path('recipients/import/', views.RecipientImportView.as_view(), name='recipients_import'),
+    path('recipients/export/', views.RecipientExportView.as_view(), name='recipients_export'),
     path('recipients/<int:pk>/', views.RecipientDetailView.as_view(), name='recipients_detail'),
     path('recipients/<int:pk>/edit/', views.RecipientUpdateView.as_view(), name='recipients_update'),
     path('recipients/<int:pk>/delete/', views.RecipientDeleteView.as_view(), name='recipients_delete'),
+    path('unsubscribe/<str:token>/', views.UnsubscribeView.as_view(), name='unsubscribe'),
+
+    path('segments/', views.SegmentListView.as_view(), name='segment_list'),
+    path('segments/add/', views.SegmentCreateView.as_view(), name='segment_create'),
+    path('segments/<int:pk>/edit/', views.SegmentUpdateView.as_view(), name='segment_update'),
+    path('segments/<int:pk>/delete/', views.SegmentDeleteView.as_view(), name='segment_delete'),
 
     path('messages/', views.MessageListView.as_view(), name='message_list'),
     path('messages/add/', views.MessageCreateView.as_view(), name='message_create'),
@@ -24,6 +34,7 @@ urlpatterns = [
     path('mailings/', views.MailingListView.as_view(), name='mailing_list'),
     path('mailings/add/', views.MailingCreateView.as_view(), name='mailing_create'),
     path('mailings/<int:pk>/', views.MailingDetailView.as_view(), name='mailing_detail'),
+    path('mailings/<int:pk>/recipients/', views.MailingRecipientsPageView.as_view(), name='mailing_recipients'),
     path('mailings/<int:pk>/edit/', views.MailingUpdateView.as_view(), name='mailing_update'),
     path('mailings/<int:pk>/delete/', views.MailingDeleteView.as_view(), name='mailing_delete'),
 
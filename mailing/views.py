@@ -1,20 +1,33 @@
+import csv
+from itertools import chain
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404, redirect
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
-from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.cache import cache_page
-from django.views.generic import (CreateView, DeleteView, DetailView, ListView,
-                                  TemplateView, UpdateView)
+from django.views.generic import (CreateView, DeleteView, DetailView, FormView,
+                                  ListView, TemplateView, UpdateView)
 
+from core.cache import cache_per_user
 from core.mixins import OwnerOrPermissionMixin
+from core.pagination import KeysetPaginator
 from core.permisions import PermissionRequiredMixin
-
-from .forms import MailingForm, MailingRecipientsForm, MessageForm
-from .models import Mailing, MailingIsSuccess, MailingRecipients, Message
+from core.utils import keyset_rows
+
+from .forms import (MailingForm, MailingRecipientsForm, MessageForm,
+                    RecipientImportForm, SegmentForm)
+from .importers import RecipientImporter
+from .models import (Mailing, MailingIsSuccess, MailingRecipients,
+                     MailingStatus, Message, RecipientSegment)
+from .rendering import unsubscribe_recipient_id
 from .services import MailingServices
+from .stats import StatsServices
 
 
 @method_decorator(cache_page(60 * 5), name='dispatch')
@@ -23,28 +36,13 @@ class IndexView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
-
-        context['total_mailings'] = Mailing.objects.count()
-
-        context['active_mailings'] = Mailing.objects.filter(
-            start__lte=now,
-            end__gte=now,
-            status='Запущена'
-        ).count()
-
-        context['unique_recipients'] = MailingRecipients.objects.count()
-
-        # Новое для шага 8
-        context['attempts_success'] = MailingIsSuccess.objects.filter(status='Успешно').count()
-        context['attempts_failed'] = MailingIsSuccess.objects.filter(status='Не успешно').count()
-        context['attempts_total'] = MailingIsSuccess.objects.count()
-
+        # Счётчики обновляются при записи попыток и смене статусов, сверяются reconcile_stats
+        context.update(StatsServices.read())
         return context
 
 
 class MailingSendView(LoginRequiredMixin, View):
-    """Ручная отправка рассылки"""
+    """Ручная отправка рассылки: задание ставится в очередь run_mailing_worker"""
 
     def post(self, request, pk):
         mailing = get_object_or_404(Mailing, pk=pk)
@@ -57,19 +55,27 @@ class MailingSendView(LoginRequiredMixin, View):
             messages.error(request, error_message)
             return redirect('mailing:mailing_detail', pk=pk)
 
-        result = MailingServices.send_mailing(mailing, from_email='Apeecks@mail.ru')
+        job = MailingServices.enqueue_mailing(mailing)
 
         messages.success(
             request,
-            f"Рассылка обработана. Успешно: {result['sent']}, Ошибки: {result['failed']}"
+            f"Рассылка поставлена в очередь отправки (задание №{job.id})."
         )
         return redirect('mailing:mailing_detail', pk=pk)
 
 
 class AttemptListView(LoginRequiredMixin, ListView):
     model = MailingIsSuccess
+    queryset = MailingIsSuccess.objects.select_related("mailing__message")
     template_name = "attempts/list.html"
     paginate_by = 30
+    # Страницы по ключу (date_mailing, id) и индексу attempt_date_id_idx вместо COUNT(*) и OFFSET
+    keyset_fields = ("date_mailing", "id")
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_fields, page_size)
+        page = paginator.page(after=self.request.GET.get("after"), before=self.request.GET.get("before"))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -82,21 +88,51 @@ class AttemptListView(LoginRequiredMixin, ListView):
         return qs.filter(mailing__owner=self.request.user)
 
 
+class EchoBuffer:
+    """Псевдофайл для csv.writer: записанная строка сразу возвращается"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """CSV-ответ, который формируется по мере чтения строк, без сборки файла в памяти"""
+    writer = csv.writer(EchoBuffer())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in chain([header], rows)),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class AttemptExportView(LoginRequiredMixin, View):
+    """Выгрузка попыток рассылок в CSV с теми же правами, что и у списка"""
+    fields = ("id", "mailing_id", "recipient__email", "status", "code", "answer", "date_mailing")
+
+    def get(self, request):
+        qs = MailingIsSuccess.objects.all()
+        if not request.user.has_perm("mailing.can_view_all_mailings"):
+            qs = qs.filter(mailing__owner=request.user)
+        return stream_csv("attempts.csv", self.fields, keyset_rows(qs, self.fields))
+
+
 class DisableMailingView(PermissionRequiredMixin, View):
-    permission_required = "mailing.can_disable_mailing"
+    required_permissions = ["mailing.can_disable_mailing"]
 
     def post(self, request, pk):
         mailing = get_object_or_404(Mailing, pk=pk)
-        mailing.status = "Отключена"
+        mailing.status = MailingStatus.DISABLED
         mailing.save(update_fields=["status"])
         messages.success(request, "Рассылка отключена менеджером.")
         return redirect("mailing:mailing_detail", pk=pk)
 
 
 # ===== Recipient =====
-@method_decorator(cache_page(60), name='dispatch')
+@method_decorator(cache_per_user(60, [MailingRecipients]), name='dispatch')
 class RecipientListView(LoginRequiredMixin, ListView):
     model = MailingRecipients
+    queryset = MailingRecipients.objects.select_related("owner")
     template_name = 'recipients/list.html'
     context_object_name = 'recipients'
     paginate_by = 25
@@ -112,8 +148,83 @@ class RecipientListView(LoginRequiredMixin, ListView):
         return qs.filter(owner=self.request.user)
 
 
+class RecipientExportView(LoginRequiredMixin, View):
+    """Выгрузка получателей в CSV с теми же правами, что и у списка"""
+    fields = ("id", "email", "full_name", "comment")
+
+    def get(self, request):
+        qs = MailingRecipients.objects.all()
+        if not request.user.has_perm("mailing.can_manage_recipients"):
+            qs = qs.filter(owner=request.user)
+        return stream_csv("recipients.csv", self.fields, keyset_rows(qs, self.fields))
+
+
+class RecipientSearchView(LoginRequiredMixin, View):
+    """JSON-поиск получателей по началу email или Ф.И.О. для виджета выбора в форме рассылки"""
+    limit = 20
+    min_length = 2
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        if len(query) < self.min_length:
+            return JsonResponse({"results": []})
+
+        # istartswith использует индексы по UPPER(email) и UPPER(full_name), см. MailingRecipients.Meta
+        qs = MailingRecipients.objects.filter(
+            Q(email__istartswith=query) | Q(full_name__istartswith=query),
+            unsubscribed=False,
+        )
+        # та же видимость, что у поля recipients в MailingForm
+        if not request.user.has_perm("mailing.can_manage_mailings"):
+            qs = qs.filter(owner=request.user)
+
+        rows = qs.order_by("email").values_list("id", "email", "full_name")[:self.limit]
+        return JsonResponse({
+            "results": [{"id": pk, "text": f"{full_name} <{email}>"} for pk, email, full_name in rows],
+        })
+
+
+class RecipientImportView(LoginRequiredMixin, FormView):
+    """Загрузка получателей из CSV/XLSX; результат показывается на той же странице"""
+    form_class = RecipientImportForm
+    template_name = 'recipients/import.html'
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        importer = RecipientImporter(self.request.user)
+        try:
+            result = importer.import_file(upload.file, upload.name)
+        except ValidationError as exc:
+            form.add_error('file', exc)
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=RecipientImportForm(), result=result))
+
+
+class UnsubscribeView(View):
+    """Отписка получателя по ссылке из письма; подписанный токен заменяет авторизацию"""
+    template_name = 'recipients/unsubscribe.html'
+
+    def get_recipient(self, token):
+        recipient_id = unsubscribe_recipient_id(token)
+        if recipient_id is None:
+            raise Http404
+        return get_object_or_404(MailingRecipients, pk=recipient_id)
+
+    def get(self, request, token):
+        recipient = self.get_recipient(token)
+        return render(request, self.template_name, {'recipient': recipient})
+
+    def post(self, request, token):
+        recipient = self.get_recipient(token)
+        if not recipient.unsubscribed:
+            recipient.unsubscribed = True
+            recipient.save(update_fields=['unsubscribed'])
+        return render(request, self.template_name, {'recipient': recipient, 'done': True})
+
+
 class RecipientDetailView(LoginRequiredMixin, OwnerOrPermissionMixin, DetailView):
     model = MailingRecipients
+    queryset = MailingRecipients.objects.select_related("owner")
     template_name = 'recipients/detail.html'
     context_object_name = 'recipient'
     required_permissions = ["mailing.can_manage_recipients"]
@@ -145,10 +256,77 @@ class RecipientDeleteView(LoginRequiredMixin, OwnerOrPermissionMixin, DeleteView
     required_permissions = ["mailing.can_manage_recipients"]
 
 
+# ===== Segment =====
+@method_decorator(cache_per_user(60, [RecipientSegment, MailingRecipients]), name='dispatch')
+class SegmentListView(LoginRequiredMixin, ListView):
+    model = RecipientSegment
+    queryset = RecipientSegment.objects.select_related("owner")
+    template_name = 'segments/list.html'
+    context_object_name = 'segments'
+    paginate_by = 25
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+
+        if self.request.user.has_perm("mailing.can_manage_recipients"):
+            return qs
+
+        return qs.filter(owner=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        segments = context['segments']
+        # Размеры всех сегментов страницы — один проход по подписанным получателям их владельцев
+        # (индекс (owner, unsubscribed)) с COUNT ... FILTER на сегмент: правила icontains
+        # проверяются по строкам, индексом они не ускоряются
+        if segments:
+            sizes = MailingRecipients.objects.filter(
+                owner_id__in={segment.owner_id for segment in segments}, unsubscribed=False,
+            ).aggregate(**{
+                f"segment_{segment.pk}": Count("pk", filter=segment.get_filter()) for segment in segments
+            })
+            for segment in segments:
+                segment.size = sizes[f"segment_{segment.pk}"]
+        return context
+
+
+class SegmentCreateView(LoginRequiredMixin, CreateView):
+    model = RecipientSegment
+    form_class = SegmentForm
+    template_name = 'segments/form.html'
+    success_url = reverse_lazy('mailing:segment_list')
+
+    def form_valid(self, form):
+        form.instance.owner = self.request.user
+        return super().form_valid(form)
+
+
+class SegmentUpdateView(LoginRequiredMixin, OwnerOrPermissionMixin, UpdateView):
+    model = RecipientSegment
+    form_class = SegmentForm
+    template_name = 'segments/form.html'
+    success_url = reverse_lazy('mailing:segment_list')
+    required_permissions = ["mailing.can_manage_recipients"]
+
+
+class SegmentDeleteView(LoginRequiredMixin, OwnerOrPermissionMixin, DeleteView):
+    model = RecipientSegment
+    template_name = 'segments/confirm_delete.html'
+    success_url = reverse_lazy('mailing:segment_list')
+    required_permissions = ["mailing.can_manage_recipients"]
+
+    def form_valid(self, form):
+        if self.object.mailings.exists():
+            messages.error(self.request, "Сегмент используется в рассылках и не может быть удалён.")
+            return redirect('mailing:segment_list')
+        return super().form_valid(form)
+
+
 # ===== Message =====
-@method_decorator(cache_page(60), name='dispatch')
+@method_decorator(cache_per_user(60, [Message]), name='dispatch')
 class MessageListView(LoginRequiredMixin, ListView):
     model = Message
+    queryset = Message.objects.select_related("owner")
     template_name = 'message/list.html'
     paginate_by = 25
 
@@ -174,6 +352,7 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
 
 class MessageDetailView(LoginRequiredMixin, OwnerOrPermissionMixin, DetailView):
     model = Message
+    queryset = Message.objects.select_related("owner")
     template_name = 'message/detail.html'
     required_permissions = ["mailing.can_manage_messages"]
 
@@ -194,20 +373,32 @@ class MessageDeleteView(LoginRequiredMixin, OwnerOrPermissionMixin, DeleteView):
 
 
 # ===== Mailing =====
-@method_decorator(cache_page(60), name='dispatch')
+@method_decorator(cache_per_user(60, [Mailing, Message]), name='dispatch')
 class MailingListView(LoginRequiredMixin, ListView):
     model = Mailing
+    queryset = Mailing.objects.select_related("message", "owner")
     template_name = 'mailing/list.html'
     paginate_by = 25
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        # Статус вычисляется в запросе: список всегда актуален и ничего не записывает
+        qs = MailingServices.with_current_status(super().get_queryset())
+
+        status = self.request.GET.get("status")
+        if status:
+            qs = MailingServices.filter_by_status(qs, int(status) if status.isdigit() else None)
 
         if self.request.user.has_perm("mailing.can_view_all_mailings"):
             return qs
 
         return qs.filter(owner=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["statuses"] = MailingStatus.choices
+        context["current_filter"] = self.request.GET.get("status", "")
+        return context
+
 
 class MailingCreateView(LoginRequiredMixin, CreateView):
     model = Mailing
@@ -227,6 +418,7 @@ class MailingCreateView(LoginRequiredMixin, CreateView):
         # обычный пользователь видит только свои данные
         form.fields['message'].queryset = form.fields['message'].queryset.filter(owner=user)
         form.fields['recipients'].queryset = form.fields['recipients'].queryset.filter(owner=user)
+        form.fields['segment'].queryset = form.fields['segment'].queryset.filter(owner=user)
 
         return form
 
@@ -254,9 +446,16 @@ class MailingUpdateView(LoginRequiredMixin, OwnerOrPermissionMixin, UpdateView):
         # обычный пользователь видит только свои данные
         form.fields['message'].queryset = form.fields['message'].queryset.filter(owner=user)
         form.fields['recipients'].queryset = form.fields['recipients'].queryset.filter(owner=user)
+        form.fields['segment'].queryset = form.fields['segment'].queryset.filter(owner=user)
 
         return form
 
+    def form_valid(self, form):
+        # После смены окна сохранённый статус должен ему соответствовать: по нему работает частичный индекс
+        if form.instance.status != MailingStatus.DISABLED:
+            form.instance.status = MailingServices.calculate_status(form.instance)
+        return super().form_valid(form)
+
 
 class MailingDeleteView(LoginRequiredMixin, OwnerOrPermissionMixin, DeleteView):
     model = Mailing
@@ -264,28 +463,36 @@ class MailingDeleteView(LoginRequiredMixin, OwnerOrPermissionMixin, DeleteView):
     success_url = reverse_lazy('mailing:mailing_list')
     required_permissions = ["mailing.can_view_all_mailings"]
 
-    def get_object(self, queryset=None):
-        obj = super().get_object(queryset)
-        MailingServices.update_mailing_status(obj)
-        return obj
-
 
 class MailingDetailView(LoginRequiredMixin, OwnerOrPermissionMixin, DetailView):
     model = Mailing
+    queryset = Mailing.objects.select_related("message", "owner", "segment")
     template_name = 'mailing/detail.html'
     required_permissions = ["mailing.can_view_all_mailings"]
 
-    def get_object(self, queryset=None):
-        obj = super().get_object(queryset)
-        MailingServices.update_mailing_status(obj)
-        return obj
+    def get_queryset(self):
+        return MailingServices.with_current_status(super().get_queryset())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         mailing = self.object
 
-        context["attempts_success"] = mailing.attempts.filter(status="Успешно").count()
-        context["attempts_failed"] = mailing.attempts.filter(status="Не успешно").count()
-        context["attempts_total"] = mailing.attempts.count()
+        # Журнал по индексу (mailing, status) плюс дневная сводка по удалённым секциям
+        context.update(StatsServices.attempt_counts(mailing))
 
         return context
+
+
+class MailingRecipientsPageView(LoginRequiredMixin, OwnerOrPermissionMixin, ListView):
+    """Страница получателей рассылки, подгружается на странице рассылки по запросу"""
+    template_name = 'mailing/recipients_page.html'
+    context_object_name = 'recipients'
+    paginate_by = 50
+    required_permissions = ["mailing.can_view_all_mailings"]
+
+    def get_object(self):
+        self.mailing = get_object_or_404(Mailing, pk=self.kwargs["pk"])
+        return self.mailing
+
+    def get_queryset(self):
+        return self.mailing.get_recipients().only("id", "email", "full_name").order_by("pk")
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+PERMISSIONS_VERSION_KEY = "permissions:version"
+
+
+def bump_permissions_version():
+    """Сбрасывает закешированные права всех пользователей"""
+    if not cache.add(PERMISSIONS_VERSION_KEY, 2, None):
+        try:
+            cache.incr(PERMISSIONS_VERSION_KEY)
+        except ValueError:
+            cache.set(PERMISSIONS_VERSION_KEY, 2, None)
+
+
+class CachedPermissionsBackend(ModelBackend):
+    """
+    ModelBackend, который хранит набор прав пользователя в общем кеше (Redis).
+    В пределах запроса права лежат на объекте пользователя, между запросами — в кеше
+    под ключом с версией; версия растёт при изменении прав групп и пользователей.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            version = cache.get(PERMISSIONS_VERSION_KEY, 1)
+            key = f"permissions:{version}:{user_obj.pk}:{user_obj.is_superuser}"
+            perms = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, getattr(settings, "PERMISSIONS_CACHE_TIMEOUT", 3600))
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
@@ -0,0 +1,44 @@
+import signal
+import sys
+
+from django.core.management.base import BaseCommand
+
+from mailing.delivery import SMTPConnectionPool
+from users.outbox import OutboxSender, OutboxServices
+
+
+class Command(BaseCommand):
+    help = "Отправляет служебные письма (активация, вход) из очереди OutboxEmail через одно переиспользуемое соединение"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Пауза между опросами пустой очереди, сек.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Отправить ожидающие письма и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            total_sent = total_failed = 0
+            with SMTPConnectionPool(size=1) as pool:
+                while True:
+                    sent, failed = OutboxServices.send_pending(pool)
+                    total_sent += sent
+                    total_failed += failed
+                    if not sent:
+                        break
+            self.stdout.write(self.style.SUCCESS(f"Отправлено: {total_sent}, ошибок: {total_failed}"))
+            return
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        sender = OutboxSender(options["interval"], log=self.stdout.write)
+        sender.start()
+        self.stdout.write("Отправитель служебных писем запущен")
+        try:
+            while sender.is_alive():
+                sender.join(1)
+        finally:
+            sender.stop()
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('body', models.TextField(verbose_name='Текст письма')),
+                ('from_email', models.CharField(blank=True, max_length=254, verbose_name='Отправитель')),
+                ('to', models.EmailField(max_length=254, verbose_name='Получатель')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Ожидает отправки'), (2, 'Не отправлено')], default=1, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить не раньше')),
+            ],
+            options={
+                'verbose_name': 'Служебное письмо',
+                'verbose_name_plural': 'Служебные письма',
+                'db_table': 'OutboxEmail',
+                'ordering': ['available_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 1)), fields=['available_at'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
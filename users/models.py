@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -31,3 +34,76 @@ class CustomUser(AbstractUser):
             ("can_block_users", "Может блокировать пользователей"),
             ("can_view_users", "Может просматривать всех пользователей"),
         ]
+        indexes = [
+            # поиск в списке пользователей по началу строки (istartswith -> UPPER(...) LIKE 'q%')
+            models.Index(OpClass(Upper("email"), name="text_pattern_ops"), name="user_email_prefix_idx"),
+            models.Index(OpClass(Upper("country"), name="text_pattern_ops"), name="user_country_prefix_idx"),
+        ]
+
+
+class OutboxStatus(models.IntegerChoices):
+    PENDING = 1, 'Ожидает отправки'
+    FAILED = 2, 'Не отправлено'
+
+
+class OutboxEmail(models.Model):
+    """
+    Служебное письмо (активация, уведомление о входе) в очереди отправки.
+    Записывается в транзакции запроса, отправляется фоновым отправителем (users.outbox);
+    отправленные письма удаляются из очереди.
+    """
+
+    subject = models.CharField(
+        max_length=255,
+        verbose_name='Тема',
+    )
+    body = models.TextField(
+        verbose_name='Текст письма',
+    )
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        verbose_name='Отправитель',
+    )
+    to = models.EmailField(
+        verbose_name='Получатель',
+    )
+    status = models.PositiveSmallIntegerField(
+        choices=OutboxStatus.choices,
+        default=OutboxStatus.PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток отправки',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Отправить не раньше',
+    )
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
+
+    class Meta:
+        verbose_name = "Служебное письмо"
+        verbose_name_plural = "Служебные письма"
+        ordering = [
+            "available_at",
+        ]
+        db_table = "OutboxEmail"
+        indexes = [
+            # отправитель опрашивает только ожидающие письма, отправленные из таблицы удаляются
+            models.Index(
+                fields=["available_at"],
+                name="outbox_pending_idx",
+                condition=models.Q(status=OutboxStatus.PENDING),
+            ),
+        ]
@@ -0,0 +1,119 @@
+import smtplib
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from mailing.delivery import SMTPConnectionPool
+
+from .models import OutboxEmail, OutboxStatus
+
+
+class OutboxServices:
+    @staticmethod
+    def enqueue(subject, body, to, from_email=None):
+        """
+        Ставит служебное письмо в очередь.
+        Вызывается в транзакции запроса: письмо появится в очереди только вместе с её изменениями.
+        """
+        return OutboxEmail.objects.create(
+            subject=subject,
+            body=body,
+            to=to,
+            from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', None) or '',
+        )
+
+    @staticmethod
+    def send_pending(pool, batch_size=None, max_attempts=None, retry_delay=None):
+        """
+        Отправляет пачку ожидающих писем через соединение пула, возвращает (отправлено, ошибок).
+
+        Пачка блокируется SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько отправителей
+        не берут одно письмо. Отправленные письма удаляются; неотправленные откладываются
+        с удвоением паузы, после max_attempts попыток получают статус «Не отправлено».
+        Письмо, которое не удалось собрать, сразу получает этот статус и не мешает остальным.
+        При обрыве связи с сервером пачка прерывается, остальные письма ждут следующего опроса.
+        """
+        batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+        max_attempts = max_attempts or getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+        retry_delay = retry_delay or getattr(settings, 'OUTBOX_RETRY_DELAY', 30)
+
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboxEmail.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=OutboxStatus.PENDING, available_at__lte=now)
+                .order_by('available_at')[:batch_size]
+            )
+            sent, failed = [], []
+            for item in batch:
+                try:
+                    pool.send(EmailMessage(item.subject, item.body, item.from_email or None, [item.to]))
+                except (OSError, smtplib.SMTPException) as exc:
+                    item.attempts += 1
+                    item.error = str(exc)
+                    if item.attempts >= max_attempts:
+                        item.status = OutboxStatus.FAILED
+                    else:
+                        item.available_at = now + timedelta(seconds=retry_delay * 2 ** (item.attempts - 1))
+                    failed.append(item)
+                    # Отказ по адресу не мешает остальным письмам, обрыв связи — мешает
+                    if not isinstance(exc, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                        break
+                except Exception as exc:
+                    # Письмо не собирается (BadHeaderError, ValueError): повтор не поможет,
+                    # а откат пачки отправил бы уже ушедшие письма ещё раз
+                    item.attempts += 1
+                    item.error = f"{type(exc).__name__}: {exc}"
+                    item.status = OutboxStatus.FAILED
+                    failed.append(item)
+                else:
+                    sent.append(item.pk)
+
+            OutboxEmail.objects.filter(pk__in=sent).delete()
+            OutboxEmail.objects.bulk_update(failed, ['attempts', 'error', 'status', 'available_at'])
+        return len(sent), len(failed)
+
+
+class OutboxSender(threading.Thread):
+    """
+    Приоритетная полоса служебных писем: свой поток и своё соединение,
+    поэтому письма активации и входа не ждут окончания массовой рассылки.
+    Пока в очереди есть письма, пачки отправляются подряд, иначе очередь опрашивается раз в interval секунд.
+    """
+
+    def __init__(self, interval, log=None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.log = log or (lambda message: None)
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            with SMTPConnectionPool(size=1) as pool:
+                while not self.stopped.is_set():
+                    try:
+                        sent, failed = OutboxServices.send_pending(pool)
+                    except DatabaseError as exc:
+                        self.log(f"Очередь служебных писем недоступна: {exc}")
+                        # следующий опрос откроет новое соединение с базой
+                        connection.close()
+                        sent = failed = 0
+                    except Exception as exc:
+                        # поток-демон не должен завершаться молча: письма входа и активации перестали бы уходить
+                        self.log(f"Ошибка отправки служебных писем: {type(exc).__name__}: {exc}")
+                        sent = failed = 0
+                    if sent or failed:
+                        self.log(f"Служебные письма: отправлено {sent}, ошибок {failed}")
+                    if not sent:
+                        self.stopped.wait(self.interval)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .backends import bump_permissions_version
+from .models import CustomUser
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def permissions_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_permissions_version()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, **kwargs):
+    bump_permissions_version()
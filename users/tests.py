@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from mailing.delivery import SMTPConnectionPool
+
+from .models import CustomUser, OutboxEmail, OutboxStatus
+from .outbox import OutboxSender, OutboxServices
+
+
+class OutboxTests(TestCase):
+    def test_unbuildable_email_fails_alone(self):
+        OutboxServices.enqueue('Вход', 'Код', 'first@example.com')
+        # перевод строки в теме Django отвергает как подмену заголовков (BadHeaderError)
+        poison = OutboxServices.enqueue('Вход\nBcc: evil@example.com', 'Код', 'poison@example.com')
+        OutboxServices.enqueue('Вход', 'Код', 'second@example.com')
+
+        with SMTPConnectionPool(size=1) as pool:
+            self.assertEqual(OutboxServices.send_pending(pool), (2, 1))
+
+        self.assertEqual([email.to for email in mail.outbox], [['first@example.com'], ['second@example.com']])
+        poison.refresh_from_db()
+        self.assertEqual(poison.status, OutboxStatus.FAILED)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+        # неотправляемое письмо больше не выбирается
+        with SMTPConnectionPool(size=1) as pool:
+            self.assertEqual(OutboxServices.send_pending(pool), (0, 0))
+
+    def test_sender_survives_unexpected_errors(self):
+        messages = []
+        sender = OutboxSender(interval=0.01, log=messages.append)
+
+        def send_pending(pool):
+            if len(messages) < 2:
+                raise ValueError('сбой')
+            sender.stopped.set()
+            return 0, 0
+
+        with mock.patch.object(OutboxServices, 'send_pending', side_effect=send_pending):
+            sender.start()
+            sender.join(timeout=5)
+
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(messages, ['Ошибка отправки служебных писем: ValueError: сбой'] * 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedPermissionsTests(TestCase):
+    """Права читаются из кеша и сбрасываются при изменении прав пользователя и групп"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@example.com', username='user', password='password')
+        self.permission = Permission.objects.get(codename='can_manage_messages')
+
+    def fresh_user(self):
+        # новый объект, как в следующем запросе: права на нём ещё не лежат
+        return CustomUser.objects.get(pk=self.user.pk)
+
+    def test_permissions_are_cached_between_requests(self):
+        self.assertFalse(self.fresh_user().has_perm('mailing.can_manage_messages'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user.get_all_permissions(), set())
+
+    def test_user_permission_change_invalidates_cache(self):
+        self.assertFalse(self.fresh_user().has_perm('mailing.can_manage_messages'))
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('mailing.can_manage_messages'))
+        self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.fresh_user().has_perm('mailing.can_manage_messages'))
+
+    def test_group_changes_invalidate_cache(self):
+        group = Group.objects.create(name='Менеджеры')
+        self.user.groups.add(group)
+        self.assertFalse(self.fresh_user().has_perm('mailing.can_manage_messages'))
+
+        group.permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('mailing.can_manage_messages'))
+
+        group.delete()
+        self.assertFalse(self.fresh_user().has_perm('mailing.can_manage_messages'))
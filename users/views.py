@@ -1,10 +1,11 @@
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.views import LoginView, LogoutView
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils.encoding import force_bytes, force_str
@@ -13,10 +14,11 @@ from django.views import View
 from django.views.generic import DetailView, ListView, UpdateView
 from django.views.generic.edit import CreateView
 
-from mailing.models import Mailing
+from mailing.models import Mailing, MailingRecipients, UserAttemptCounter
 
 from .forms import CustomUserCreationForm, UserProfileForm
 from .models import CustomUser
+from .outbox import OutboxServices
 
 
 class BlockUserView(UserPassesTestMixin, View):
@@ -36,10 +38,53 @@ class UserListView(UserPassesTestMixin, ListView):
     model = CustomUser
     template_name = "users/user_list.html"
     context_object_name = "users"
+    paginate_by = 50
 
     def test_func(self):
         return self.request.user.is_staff
 
+    def get_queryset(self):
+        qs = CustomUser.objects.order_by("email")
+
+        # istartswith использует индексы по UPPER(email) и UPPER(country), см. CustomUser.Meta
+        query = self.request.GET.get("q", "").strip()
+        if query:
+            qs = qs.filter(Q(email__istartswith=query) | Q(country__istartswith=query))
+        return qs
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Страница выбирается по id, счётчики добавляются одним запросом только для её строк:
+        иначе PostgreSQL вычислял бы подзапросы и для строк, пропущенных OFFSET.
+        """
+        paginator, page, ids, is_paginated = super().paginate_queryset(
+            queryset.values_list("pk", flat=True), page_size
+        )
+        page.object_list = list(self.with_activity(CustomUser.objects.filter(pk__in=list(ids))).order_by("email"))
+        return paginator, page, page.object_list, is_paginated
+
+    @staticmethod
+    def with_activity(qs):
+        """Рассылки и получатели — по индексам owner, попытки — из счётчика UserAttemptCounter, а не по журналу"""
+        return qs.annotate(
+            mailings_count=Coalesce(Subquery(
+                Mailing.objects.filter(owner=OuterRef("pk")).order_by()
+                .values("owner").annotate(total=Count("id")).values("total")
+            ), 0),
+            recipients_count=Coalesce(Subquery(
+                MailingRecipients.objects.filter(owner=OuterRef("pk")).order_by()
+                .values("owner").annotate(total=Count("id")).values("total")
+            ), 0),
+            attempts_count=Coalesce(Subquery(
+                UserAttemptCounter.objects.filter(user=OuterRef("pk")).values("value")
+            ), 0),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "").strip()
+        return context
+
 
 class ActivateView(View):
     """
@@ -69,10 +114,12 @@ class RegisterView(CreateView):
     success_url = reverse_lazy("users:register_done")
 
     def form_valid(self, form):
-        user: CustomUser = form.save(commit=False)
-        user.is_active = False
-        user.save()
-        self.send_activation_email(user, self.request)
+        # Письмо ставится в очередь вместе с пользователем: SMTP не задерживает ответ и не ломает регистрацию
+        with transaction.atomic():
+            user: CustomUser = form.save(commit=False)
+            user.is_active = False
+            user.save()
+            self.send_activation_email(user, self.request)
         return super().form_valid(form)
 
     def send_activation_email(self, user, request):
@@ -87,9 +134,7 @@ class RegisterView(CreateView):
             f"Чтобы подтвердить регистрацию, перейдите по ссылке:\n\n{activation_link}\n\n"
             f"Если вы не регистрировались — проигнорируйте это письмо."
         )
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-        recipient_list = [user.email]
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+        OutboxServices.enqueue(subject, message, user.email)
 
 
 class RegisterDoneView(CreateView):
@@ -100,16 +145,15 @@ class CustomLoginView(LoginView):
     template_name = "users/login.html"
 
     def form_valid(self, form):
-        user = form.get_user()
-        self.send_welcome_email(user.email)
-        return super().form_valid(form)
+        # Уведомление записывается в одной транзакции со входом, отправляет его send_outbox / run_mailing_worker
+        with transaction.atomic():
+            self.send_welcome_email(form.get_user().email)
+            return super().form_valid(form)
 
     def send_welcome_email(self, email):
         subject = "Уведомление о входе"
         message = "Вы успешно вошли в систему. Если это были не вы — смените пароль."
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-        recipient_list = [email]
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+        OutboxServices.enqueue(subject, message, email)
 
 
 class CustomLogoutView(LogoutView):